@@ -0,0 +1 @@
+"""Makes the backend's top-level packages (services, models) importable from tests/."""
@@ -1,22 +1,47 @@
+import hashlib
 import json
 import os
 import random
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.responses import StreamingResponse
 from pydantic import BaseModel
 from models.schemas import ProductInput, GenerateRequest, GenerateResponse, SubredditDrafts
 from models.published_posts_schemas import PublishRequest, CampaignResponse, PostMetrics, CommentData
-from services.subreddit_discovery import discover_subreddits
+from services.subreddit_discovery import discover_subreddits, stats as discovery_stats
 from services.website_extract import extract_product_from_url
-from services.reddit_scraper import scrape_and_rank, scrape_and_rank_stream
-from services.post_generator import generate_all_posts
-from services.campaign_storage import save_campaign, get_latest_campaign
+from services.reddit_scraper import scrape_and_rank_async, scrape_and_rank_stream, cache_stats as scraper_cache_stats
+from services.post_generator import generate_all_posts_async, iter_generated_posts_stream, cache_stats as draft_cache_stats
+from services.campaign_storage import (
+    save_campaign, get_campaign, get_campaign_posts, get_post_comments, list_campaigns, resolve_campaign_id,
+)
 from services.persona_comments import generate_comments_for_post_async
+from services.comment_sentiment import classify_sentiments
+from services.worker_pool import run_blocking
+from services.llm_scheduler import LANE_BACKGROUND, create_message
+from services import llm_scheduler
+from services import embedding_model, llm_clients, reddit_client, website_extract, worker_pool
+from contextlib import asynccontextmanager
 import asyncio
 
-app = FastAPI(title="LexTrack AI Backend")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await llm_clients.startup()
+    # Load the embedding model in the background: /health answers right away,
+    # /ready turns 200 once the first scrape won't pay the cold start
+    warmup = asyncio.create_task(run_blocking(embedding_model.warm_up)) if embedding_model.WARMUP_ON_STARTUP else None
+    yield
+    if warmup is not None and not warmup.done():
+        warmup.cancel()
+    await llm_clients.shutdown()
+    await reddit_client.aclose()
+    website_extract.close()
+    worker_pool.shutdown()
+
+
+app = FastAPI(title="LexTrack AI Backend", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -37,6 +62,24 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/ready")
+def ready():
+    """Readiness: 200 once the embedding model is loaded, 503 while cold/loading/failed."""
+    state = embedding_model.status()
+    return JSONResponse(content={"ready": embedding_model.is_ready(), "embedding_model": state},
+                        status_code=200 if embedding_model.is_ready() else 503)
+
+
+@app.get("/api/metrics")
+def api_metrics():
+    """Process-local counters: LLM scheduler per model, cache hit rates, discovery latency."""
+    return {
+        "llm": llm_scheduler.stats(),
+        "caches": {**scraper_cache_stats(), **draft_cache_stats()},
+        "discovery": discovery_stats(),
+    }
+
+
 # ==========================================
 #  /api/discover — subreddit discovery
 # ==========================================
@@ -46,7 +89,7 @@ async def api_discover(product: ProductInput, request: Request):
     """Takes product info, returns 5 relevant subreddit URLs via Claude."""
     try:
         api_key = get_api_key(request)
-        result = discover_subreddits(product, api_key=api_key)
+        result = await discover_subreddits(product, api_key=api_key)
         return result
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
@@ -65,7 +108,7 @@ async def api_autofill(body: AutofillRequest, request: Request):
     """Fetch a website URL and extract product info via Claude."""
     try:
         api_key = get_api_key(request)
-        fields = extract_product_from_url(body.url, api_key=api_key)
+        fields = await extract_product_from_url(body.url, api_key=api_key)
         return JSONResponse(content={"ok": True, "fields": fields})
     except Exception as e:
         return JSONResponse(content={"ok": False, "error": str(e)}, status_code=400)
@@ -85,7 +128,7 @@ async def api_scrape(body: ScrapeRequest, request: Request):
     """Takes subreddit names, scrapes live data, scores & ranks them."""
     try:
         api_key = get_api_key(request)
-        result = scrape_and_rank(body.subreddit_names, body.product_description, api_key=api_key)
+        result = await scrape_and_rank_async(body.subreddit_names, body.product_description, api_key=api_key)
         return result
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
@@ -99,9 +142,10 @@ async def api_scrape(body: ScrapeRequest, request: Request):
 async def api_scrape_stream(body: ScrapeRequest, request: Request):
     """SSE endpoint: streams progress events during scrape & rank."""
     api_key = get_api_key(request)
-    def event_generator():
+
+    async def event_generator():
         try:
-            for event in scrape_and_rank_stream(body.subreddit_names, body.product_description, api_key=api_key):
+            async for event in scrape_and_rank_stream(body.subreddit_names, body.product_description, api_key=api_key):
                 yield f"data: {json.dumps(event)}\n\n"
         except Exception as e:
             yield f"data: {json.dumps({'phase': 'error', 'message': str(e)})}\n\n"
@@ -130,7 +174,7 @@ async def api_generate(body: GenerateRequest, request: Request):
             "keywords": body.keywords,
         }
         subreddits = [s.model_dump() for s in body.subreddits]
-        results = generate_all_posts(product, subreddits, api_key=api_key)
+        results = await generate_all_posts_async(product, subreddits, api_key=api_key, regenerate=body.regenerate)
         return GenerateResponse(
             product_name=body.product_name,
             subreddit_drafts=[SubredditDrafts(**r) for r in results],
@@ -139,6 +183,69 @@ async def api_generate(body: GenerateRequest, request: Request):
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 
+# ==========================================
+#  /api/generate-stream — SSE post generation
+# ==========================================
+
+@app.post("/api/generate-stream")
+async def api_generate_stream(body: GenerateRequest, request: Request):
+    """
+    SSE endpoint: each subreddit's drafts arrive as they are written.
+      draft_delta     partial title/body of the draft being written
+      draft           one validated draft
+      subreddit_done  a subreddit's final 3 drafts
+      done            the full GenerateResponse, in input order
+    """
+    api_key = get_api_key(request)
+    product = {
+        "product_name": body.product_name,
+        "product_description": body.product_description,
+        "niche_category": body.niche_category,
+        "target_audience": body.target_audience,
+        "keywords": body.keywords,
+    }
+    subreddits = [s.model_dump() for s in body.subreddits]
+
+    async def event_generator():
+        total = len(subreddits)
+        results = [None] * total
+        completed = 0
+        yield f"data: {json.dumps({'phase': 'generating', 'progress': 0, 'message': f'Generating posts for {total} subreddits'})}\n\n"
+        try:
+            async for index, kind, draft_index, payload in iter_generated_posts_stream(
+                product, subreddits, api_key=api_key, regenerate=body.regenerate
+            ):
+                sub = subreddits[index].get("subreddit", "")
+                event = {"subreddit": sub, "progress": int(completed / total * 100) if total else 100}
+                if kind == "delta":
+                    event.update(phase="draft_delta", draft_index=draft_index, partial=payload)
+                elif kind == "draft":
+                    event.update(phase="draft", draft_index=draft_index, draft=payload)
+                else:
+                    completed += 1
+                    results[index] = {"subreddit": sub, "drafts": payload}
+                    event.update(
+                        phase="subreddit_done",
+                        drafts=payload,
+                        progress=int(completed / total * 100),
+                        message=f"Drafts ready for r/{sub} ({completed}/{total})",
+                    )
+                yield f"data: {json.dumps(event)}\n\n"
+            response = GenerateResponse(
+                product_name=body.product_name,
+                subreddit_drafts=[SubredditDrafts(**r) for r in results],
+            )
+            yield f"data: {json.dumps({'phase': 'done', 'progress': 100, 'message': 'Generation complete', 'result': response.model_dump()})}\n\n"
+        except Exception as e:
+            yield f"data: {json.dumps({'phase': 'error', 'message': str(e)})}\n\n"
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # ==========================================
 #  /api/campaigns/publish — Save & process campaign
 # ==========================================
@@ -151,39 +258,29 @@ async def api_publish_campaign(body: PublishRequest, request: Request):
     OPTIMIZED: Uses parallel API calls for faster processing.
     """
     try:
-        from anthropic import AsyncAnthropic
         api_key = get_api_key(request)
-        anthropic_client = AsyncAnthropic(api_key=api_key)
 
-        # Process each post in parallel
-        async def process_single_post(post):
-            # Prepare post data for comment generation
+        # Generate 2-15 persona-based comments per post (all posts in parallel)
+        async def generate_post_comments(post):
             post_data = {
                 "subreddit": post.subreddit,
                 "post_type": post.post_type,
                 "title": post.title,
                 "body": post.body
             }
-
-            # Generate 2-15 persona-based comments (parallelized internally)
             num_comments = random.randint(2, 15)
-            comments = await generate_comments_for_post_async(post_data, num_comments, api_key=api_key)
+            return await generate_comments_for_post_async(post_data, num_comments, api_key=api_key)
 
-            # Analyze sentiment for all comments in parallel
-            async def analyze_sentiment(comment):
-                sentiment_prompt = f"Analyze the sentiment of this comment. Reply with ONLY one word: 'positive', 'neutral', or 'negative'.\n\nComment: {comment['body']}"
-                sentiment_response = await anthropic_client.messages.create(
-                    model="claude-sonnet-4-20250514",
-                    max_tokens=10,
-                    messages=[{"role": "user", "content": sentiment_prompt}]
-                )
-                sentiment_label = sentiment_response.content[0].text.strip().lower()
-                comment["sentiment"] = sentiment_label
-                return comment
+        comments_per_post = await asyncio.gather(*[generate_post_comments(p) for p in body.published_posts])
 
-            # Run all sentiment analyses in parallel
-            comments = await asyncio.gather(*[analyze_sentiment(c) for c in comments])
+        # Classify every comment of the campaign in batched requests
+        all_comments = [c for comments in comments_per_post for c in comments]
+        labels = await classify_sentiments([c["body"] for c in all_comments], api_key=api_key)
+        for comment, label in zip(all_comments, labels):
+            comment["sentiment"] = label
 
+        # Process each post in parallel
+        async def process_single_post(post, comments):
             # Calculate overall sentiment score
             positive_count = sum(1 for c in comments if c.get("sentiment") == "positive")
             negative_count = sum(1 for c in comments if c.get("sentiment") == "negative")
@@ -223,12 +320,16 @@ Comments: {all_text[:1000]}"""
 
             # Run recommendation and keyword extraction in parallel
             rec_response, keyword_response = await asyncio.gather(
-                anthropic_client.messages.create(
+                create_message(
+                    api_key,
+                    lane=LANE_BACKGROUND,
                     model="claude-sonnet-4-20250514",
                     max_tokens=100,
                     messages=[{"role": "user", "content": rec_prompt}]
                 ),
-                anthropic_client.messages.create(
+                create_message(
+                    api_key,
+                    lane=LANE_BACKGROUND,
                     model="claude-sonnet-4-20250514",
                     max_tokens=100,
                     messages=[{"role": "user", "content": keyword_prompt}]
@@ -262,7 +363,10 @@ Comments: {all_text[:1000]}"""
             )
 
         # Process all posts in parallel
-        processed_posts = await asyncio.gather(*[process_single_post(post) for post in body.published_posts])
+        processed_posts = await asyncio.gather(*[
+            process_single_post(post, comments)
+            for post, comments in zip(body.published_posts, comments_per_post)
+        ])
 
         # Calculate overall metrics
         total_reach = sum(p.upvotes * 15 for p in processed_posts)
@@ -297,7 +401,6 @@ Comments: {all_text[:1000]}"""
         # Build campaign data
         campaign_data = {
             "product": body.product.model_dump(),
-            "published_posts": [p.model_dump() for p in processed_posts],
             "posted_at": body.published_at,
             "overall": {
                 "total_reach": total_reach,
@@ -313,7 +416,7 @@ Comments: {all_text[:1000]}"""
         }
 
         # Save campaign
-        campaign_id = save_campaign(campaign_data)
+        campaign_id = await run_blocking(save_campaign, campaign_data)
 
         return JSONResponse(content={
             "success": True,
@@ -328,16 +431,109 @@ Comments: {all_text[:1000]}"""
 
 
 # ==========================================
-#  /api/campaigns/latest — Get latest campaign
+#  Campaign reads — list, by ID, projection, paged posts/comments
 # ==========================================
+# Saved campaigns never change, so an ETag only has to identify the campaign
+# and the query. Matching If-None-Match polls get a 304 after an index lookup,
+# without loading the campaign body.
+
+def _parse_fields(fields: str | None) -> list[str] | None:
+    return [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+
+
+def _etag(request: Request, version: str) -> str:
+    digest = hashlib.sha1(f"{version}|{request.url.path}?{request.url.query}".encode()).hexdigest()
+    return f'W/"{digest[:20]}"'
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match", "")
+    return header.strip() == "*" or etag in [t.strip() for t in header.split(",")]
+
+
+def _cached_json(etag: str, content) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if content is None:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=content, headers=headers)
+
+
+@app.get("/api/campaigns")
+async def api_list_campaigns(request: Request, limit: int = 20, cursor: str | None = None):
+    """Campaign summaries, newest first; pass next_cursor back to get the next page."""
+    try:
+        latest_id = await run_blocking(resolve_campaign_id)
+        etag = _etag(request, latest_id or "")
+        if _not_modified(request, etag):
+            return _cached_json(etag, None)
+        campaigns, next_cursor = await run_blocking(list_campaigns, limit, cursor)
+        return _cached_json(etag, {"campaigns": campaigns, "next_cursor": next_cursor})
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+
+async def _campaign_response(request: Request, campaign_id: str | None, fields: str | None) -> Response:
+    resolved = await run_blocking(resolve_campaign_id, campaign_id)
+    if not resolved:
+        return JSONResponse(content={"error": "No campaigns found" if campaign_id is None else "Campaign not found"}, status_code=404)
+    etag = _etag(request, resolved)
+    if _not_modified(request, etag):
+        return _cached_json(etag, None)
+    campaign = await run_blocking(get_campaign, resolved, _parse_fields(fields))
+    if campaign is None:
+        return JSONResponse(content={"error": "Campaign not found"}, status_code=404)
+    return _cached_json(etag, campaign)
+
 
 @app.get("/api/campaigns/latest")
-async def api_get_latest_campaign():
-    """Get the most recently published campaign."""
+async def api_get_latest_campaign(request: Request, fields: str | None = None):
+    """Get the most recently published campaign (?fields=overall,sentiment to narrow it)."""
+    try:
+        return await _campaign_response(request, None, fields)
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+
+@app.get("/api/campaigns/{campaign_id}")
+async def api_get_campaign(campaign_id: str, request: Request, fields: str | None = None):
+    """Get one campaign by ID (?fields=overall,sentiment to narrow it)."""
+    try:
+        return await _campaign_response(request, campaign_id, fields)
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+
+@app.get("/api/campaigns/{campaign_id}/posts")
+async def api_get_campaign_posts(
+    campaign_id: str, request: Request, offset: int = 0, limit: int = 20, include_comments: bool = False
+):
+    """A page of the campaign's posts; comments only with include_comments=true."""
+    try:
+        etag = _etag(request, campaign_id)
+        if _not_modified(request, etag) and await run_blocking(resolve_campaign_id, campaign_id):
+            return _cached_json(etag, None)
+        page = await run_blocking(get_campaign_posts, campaign_id, offset, limit, include_comments)
+        if page is None:
+            return JSONResponse(content={"error": "Campaign not found"}, status_code=404)
+        return _cached_json(etag, page)
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+
+@app.get("/api/campaigns/{campaign_id}/posts/{post_index}/comments")
+async def api_get_post_comments(
+    campaign_id: str, post_index: int, request: Request, offset: int = 0, limit: int = 50
+):
+    """A page of the comments on one post (post_index as returned by the posts endpoint)."""
     try:
-        campaign = get_latest_campaign()
-        if not campaign:
-            return JSONResponse(content={"error": "No campaigns found"}, status_code=404)
-        return campaign
+        etag = _etag(request, campaign_id)
+        if _not_modified(request, etag) and await run_blocking(resolve_campaign_id, campaign_id):
+            return _cached_json(etag, None)
+        page = await run_blocking(get_post_comments, campaign_id, post_index, offset, limit)
+        if page is None:
+            return JSONResponse(content={"error": "Post not found"}, status_code=404)
+        return _cached_json(etag, page)
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import BaseModel
 
 
@@ -7,6 +9,8 @@ class ProductInput(BaseModel):
     niche_category: str
     target_audience: str
     keywords: list[str]
+    # "fast" skips extended thinking in subreddit discovery
+    mode: Literal["thorough", "fast"] = "thorough"
 
 
 class SubredditResult(BaseModel):
@@ -18,6 +22,7 @@ class SubredditResult(BaseModel):
 class DiscoveryResponse(BaseModel):
     product_name: str
     subreddits: list[SubredditResult]
+    cached: bool = False  # served from the semantic discovery cache
 
 
 # --- Post Generation ---
@@ -53,6 +58,8 @@ class GenerateRequest(BaseModel):
     target_audience: str
     keywords: list[str]
     subreddits: list[SubredditInput]
+    # Skip the draft cache and generate fresh drafts (they replace the cached ones)
+    regenerate: bool = False
 
 
 class PostDraft(BaseModel):
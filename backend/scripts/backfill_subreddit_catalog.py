@@ -0,0 +1,78 @@
+"""
+Seed the subreddit catalog from the persistent scrape cache
+
+The catalog fills itself as subreddits are scored; this imports everything
+already sitting in the SQLite scrape cache (SCRAPE_CACHE_PATH), including
+expired entries, with tolerance verdicts from the tolerance cache where the
+description and rules still match.
+
+Usage:
+    SCRAPE_CACHE_PATH=data/scrape_cache.sqlite3 python scripts/backfill_subreddit_catalog.py
+"""
+
+import json
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services import embedding_model, subreddit_catalog  # noqa: E402
+from services.reddit_scraper import _subreddit_context, _tolerance_cache, _tolerance_fingerprint  # noqa: E402
+
+HOT_LIMIT = 5  # scrape_subreddit_posts_async's default, what rank_subreddits embeds
+
+
+def _prefer_hot(limit: int | None, current: int | None) -> bool:
+    """Whether hot posts fetched with `limit` beat the ones already merged."""
+    if current is None:
+        return True
+    if current == HOT_LIMIT:
+        return False
+    return limit == HOT_LIMIT or (limit or 0) > current
+
+
+def main() -> None:
+    db_path = os.getenv("SCRAPE_CACHE_PATH")
+    if not db_path or not Path(db_path).exists():
+        sys.exit("Set SCRAPE_CACHE_PATH to an existing scrape cache database")
+
+    conn = sqlite3.connect(db_path)
+    scraped: dict[str, dict] = {}
+    hot_limits: dict[str, int] = {}
+    rows = conn.execute("SELECT key, value FROM cache_entries WHERE namespace = 'reddit_scrape'")
+    for key, value in rows:
+        # Keys are "about:<sub>", "rules:<sub>" and "hot:<sub>:<limit>"
+        kind, _, sub = key.partition(":")
+        limit = None
+        if kind == "hot":
+            sub, _, limit = sub.rpartition(":")
+            limit = int(limit) if limit.isdigit() else None
+        entry = scraped.setdefault(sub, {"description": "", "subscribers": 0, "rules": [], "recent_posts": []})
+        value = json.loads(value)
+        if kind == "about":
+            entry.update(value)
+        elif kind == "rules":
+            entry["rules"] = value
+        elif kind == "hot" and _prefer_hot(limit, hot_limits.get(sub)):
+            # rank_subreddits embeds the default-limit hot posts; prefer those
+            entry["recent_posts"] = value
+            hot_limits[sub] = limit
+    conn.close()
+
+    subs = list(scraped)
+    vectors = dict(zip(subs, embedding_model.embed([_subreddit_context(scraped[s]) for s in subs]))) if subs else {}
+    tolerance = {}
+    for sub, data in scraped.items():
+        score = _tolerance_cache.get(_tolerance_fingerprint(sub, data["description"], data["rules"]))
+        if score is not None:
+            tolerance[sub] = score
+
+    recorded = subreddit_catalog.record(scraped, vectors, tolerance)
+    print(f"Recorded {recorded} of {len(scraped)} cached subreddits ({len(tolerance)} with tolerance)")
+    print(subreddit_catalog.stats())
+
+
+if __name__ == "__main__":
+    main()
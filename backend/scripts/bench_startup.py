@@ -0,0 +1,87 @@
+"""
+Startup benchmark
+
+Boots the backend with uvicorn in a subprocess and reports:
+  - import time of `main` in a fresh interpreter,
+  - boot time: process start -> first 200 from /health,
+  - warm-up time: process start -> first 200 from /ready (embedding model loaded),
+  - first-request latency of /api/scrape (optional, hits Reddit).
+
+Run it with EMBED_WARMUP=0 to measure the cold first request instead.
+
+Usage:
+    python scripts/bench_startup.py
+    python scripts/bench_startup.py --scrape fitness running --port 8011
+    EMBED_WARMUP=0 python scripts/bench_startup.py --scrape fitness
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def _import_time() -> float:
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def _wait_for(client: httpx.Client, url: str, started: float, timeout: float) -> float | None:
+    while time.perf_counter() - started < timeout:
+        try:
+            resp = client.get(url)
+            if resp.status_code == 200:
+                return time.perf_counter() - started
+            if resp.status_code == 503 and resp.json().get("embedding_model", {}).get("status") == "failed":
+                return None
+        except httpx.TransportError:
+            pass
+        time.sleep(0.05)
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--timeout", type=float, default=180.0)
+    parser.add_argument("--scrape", nargs="*", default=None, help="subreddits for a first /api/scrape")
+    args = parser.parse_args()
+
+    print(f"import main:        {_import_time():.2f}s")
+
+    base = f"http://127.0.0.1:{args.port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=os.environ.copy(),
+    )
+    try:
+        with httpx.Client(timeout=args.timeout) as client:
+            health = _wait_for(client, f"{base}/health", started, args.timeout)
+            print(f"boot -> /health:    {health:.2f}s" if health is not None else "boot -> /health:    timed out")
+            if os.getenv("EMBED_WARMUP", "1") != "0":
+                ready = _wait_for(client, f"{base}/ready", started, args.timeout)
+                print(f"boot -> /ready:     {ready:.2f}s" if ready is not None else "boot -> /ready:     not ready (see model state)")
+            if args.scrape:
+                t = time.perf_counter()
+                resp = client.post(
+                    f"{base}/api/scrape",
+                    json={"subreddit_names": args.scrape, "product_description": "A running watch for marathon training"},
+                )
+                print(f"first /api/scrape:  {time.perf_counter() - t:.2f}s (HTTP {resp.status_code})")
+            print(f"model state:        {client.get(f'{base}/ready').json()['embedding_model']}")
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
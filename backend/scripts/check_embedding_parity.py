@@ -0,0 +1,123 @@
+"""
+Parity and cost check: ONNX int8 embedding backend vs PyTorch
+
+Runs the real semantic scorer (reddit_scraper._semantic_scores) once per
+backend, each in its own process so peak RSS is comparable, and reports:
+  - per-subreddit semantic score differences and whether the ranking order
+    (and top-k) is the same,
+  - model load time, median encode time for one scoring batch, peak RSS.
+
+Exits non-zero if any score differs by more than --tolerance or the top-k
+subreddits differ, so it can gate switching EMBED_BACKEND=onnx on.
+
+Usage:
+    python scripts/export_onnx_embedder.py
+    python scripts/check_embedding_parity.py --tolerance 0.02 --top-k 5
+"""
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+PRODUCT = "A GPS running watch with marathon training plans, heart-rate zones and recovery tracking"
+
+CONTEXTS = {
+    "running": "Running news, tips and race reports. Couch to 5k finished! What shoes for a first marathon? Garmin vs Coros for training",
+    "AdvancedRunning": "For experienced runners: training blocks, workouts, racing. Pfitz 18/55 review. Threshold runs by heart rate or pace?",
+    "Marathon_Training": "Marathon training plans and questions. Long run fueling. Week 12 of Hansons, legs are toast",
+    "garmin": "Garmin devices and Connect. Forerunner 265 battery life. Training readiness keeps saying low",
+    "fitness": "Physical fitness, exercise and nutrition. Beginner full body routine. How much protein do I need?",
+    "C25K": "Couch to 5K program support. Finished week 5 run 3! Slow pace is fine right?",
+    "cycling": "Everything bikes. New gravel bike day. Zwift vs outdoor riding in winter",
+    "triathlon": "Swim, bike, run. First 70.3 race report. Brick workouts and transition tips",
+    "Entrepreneur": "A community of entrepreneurs. How I got my first 100 customers. Is dropshipping dead?",
+    "smallbusiness": "Questions and advice for small business owners. Payroll software recommendations. Hiring first employee",
+    "guitar": "Guitar players unite. New guitar day! How to practice scales without getting bored",
+    "cooking": "Recipes and cooking techniques. Cast iron seasoning tips. Best weeknight pasta",
+    "personalfinance": "Budgeting, saving, investing. Should I pay off my car loan early? Roth vs traditional 401k",
+    "ultrarunning": "Ultramarathon training and races. First 50k next month. Night running headlamps",
+    "Strava": "Strava app discussion. Segments, heatmaps, privacy zones. Why did my run upload twice?",
+    "HomeImprovement": "DIY home projects. Replacing a water heater. Best cordless drill for beginners",
+}
+
+
+def _worker(repeats: int) -> None:
+    sys.path.insert(0, str(BACKEND_DIR))
+    from services import embedding_model
+    from services.reddit_scraper import _semantic_scores
+
+    started = time.perf_counter()
+    model = embedding_model.get_model()
+    load_seconds = time.perf_counter() - started
+
+    texts = [PRODUCT] + list(CONTEXTS.values())
+    timings = []
+    for _ in range(repeats):
+        t = time.perf_counter()
+        model.encode(texts, batch_size=64, normalize_embeddings=True, convert_to_numpy=True)
+        timings.append(time.perf_counter() - t)
+
+    print(json.dumps({
+        "backend": embedding_model.EMBED_BACKEND,
+        "scores": _semantic_scores(CONTEXTS, PRODUCT),
+        "load_seconds": load_seconds,
+        "encode_ms": statistics.median(timings) * 1000,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def _run(backend: str, repeats: int) -> dict:
+    env = {**os.environ, "EMBED_BACKEND": backend, "EMBEDDING_CACHE": "0"}
+    out = subprocess.run(
+        [sys.executable, __file__, "--worker", "--repeats", str(repeats)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    if out.returncode != 0:
+        sys.exit(f"{backend} backend failed:\n{out.stderr}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tolerance", type=float, default=0.02, help="max allowed |score difference|")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        _worker(args.repeats)
+        return
+
+    torch_run, onnx_run = _run("torch", args.repeats), _run("onnx", args.repeats)
+    torch_rank = sorted(CONTEXTS, key=torch_run["scores"].get, reverse=True)
+    onnx_rank = sorted(CONTEXTS, key=onnx_run["scores"].get, reverse=True)
+
+    print(f"{'subreddit':<20} {'torch':>7} {'onnx':>7} {'diff':>7}")
+    for sub in torch_rank:
+        t, o = torch_run["scores"][sub], onnx_run["scores"][sub]
+        print(f"{sub:<20} {t:7.4f} {o:7.4f} {o - t:+7.4f}")
+
+    max_diff = max(abs(onnx_run["scores"][s] - torch_run["scores"][s]) for s in CONTEXTS)
+    same_top_k = torch_rank[:args.top_k] == onnx_rank[:args.top_k]
+    print(f"\nmax |diff|: {max_diff:.4f} (tolerance {args.tolerance})")
+    print(f"same order: {torch_rank == onnx_rank}, same top-{args.top_k}: {same_top_k}")
+
+    print(f"\n{'':<14} {'torch':>9} {'onnx':>9}")
+    for key, label in (("load_seconds", "load (s)"), ("encode_ms", "encode (ms)"), ("peak_rss_mb", "peak RSS (MB)")):
+        print(f"{label:<14} {torch_run[key]:9.1f} {onnx_run[key]:9.1f}")
+
+    if max_diff > args.tolerance or not same_top_k:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Export all-MiniLM-L6-v2 to an int8-quantized ONNX model for EMBED_BACKEND=onnx
+
+Traces the transformer behind the SentenceTransformer (token embeddings
+only; mean pooling and normalization are done in numpy by OnnxEmbedder),
+applies dynamic int8 weight quantization, and writes model.onnx plus the
+fast tokenizer's tokenizer.json to ONNX_MODEL_DIR.
+
+Needs the export-time extras (torch, sentence-transformers, onnx,
+onnxruntime); serving only needs onnxruntime + tokenizers.
+
+Usage:
+    python scripts/export_onnx_embedder.py
+    python scripts/check_embedding_parity.py
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.embedding_model import EMBED_MODEL_NAME, ONNX_MODEL_DIR  # noqa: E402
+
+INPUT_NAMES = ["input_ids", "attention_mask", "token_type_ids"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", type=Path, default=ONNX_MODEL_DIR)
+    parser.add_argument("--keep-fp32", action="store_true", help="also keep the unquantized model-fp32.onnx")
+    parser.add_argument("--opset", type=int, default=14)
+    args = parser.parse_args()
+
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    class TokenEmbeddings(torch.nn.Module):
+        def __init__(self, transformer):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.transformer(
+                input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids
+            ).last_hidden_state
+
+    model = SentenceTransformer(EMBED_MODEL_NAME, device="cpu")
+    tokenizer = model.tokenizer
+    module = TokenEmbeddings(model[0].auto_model).eval()
+
+    args.out.mkdir(parents=True, exist_ok=True)
+    fp32_path = args.out / "model-fp32.onnx"
+    sample = tokenizer(["export sample sentence", "a second, longer sample sentence"], padding=True, return_tensors="pt")
+    with torch.no_grad():
+        torch.onnx.export(
+            module,
+            tuple(sample[name] for name in INPUT_NAMES),
+            str(fp32_path),
+            input_names=INPUT_NAMES,
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"} for name in INPUT_NAMES + ["last_hidden_state"]},
+            opset_version=args.opset,
+        )
+
+    quantize_dynamic(str(fp32_path), str(args.out / "model.onnx"), weight_type=QuantType.QInt8)
+    tokenizer.save_pretrained(str(args.out))
+    if not args.keep_fp32:
+        fp32_path.unlink()
+
+    size_mb = (args.out / "model.onnx").stat().st_size / 1e6
+    print(f"Wrote {args.out / 'model.onnx'} ({size_mb:.1f} MB) and tokenizer.json")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Saturation check for /api/scrape-stream
+
+Opens N concurrent scrape streams against a running backend while polling
+/health, and reports how long the health checks took. If the event loop is
+being blocked by a scrape, the health latency spikes to seconds.
+
+Usage:
+    uvicorn main:app --port 8000 &
+    python scripts/load_scrape_stream.py --url http://localhost:8000 --streams 20
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+SUBREDDITS = ["fitness", "running", "guitar", "Entrepreneur", "smallbusiness"]
+
+
+async def _stream(client: httpx.AsyncClient, url: str) -> float:
+    start = time.perf_counter()
+    body = {"subreddit_names": SUBREDDITS, "product_description": "A running watch for marathon training"}
+    async with client.stream("POST", f"{url}/api/scrape-stream", json=body) as resp:
+        async for _ in resp.aiter_lines():
+            pass
+    return time.perf_counter() - start
+
+
+async def _poll_health(client: httpx.AsyncClient, url: str, stop: asyncio.Event, samples: list[float]) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get(f"{url}/health")
+        samples.append(time.perf_counter() - start)
+        await asyncio.sleep(0.1)
+
+
+async def main(url: str, streams: int) -> None:
+    samples: list[float] = []
+    stop = asyncio.Event()
+    async with httpx.AsyncClient(timeout=None) as client:
+        poller = asyncio.create_task(_poll_health(client, url, stop, samples))
+        durations = await asyncio.gather(*[_stream(client, url) for _ in range(streams)])
+        stop.set()
+        await poller
+
+    samples.sort()
+    print(f"streams: {streams}, slowest stream: {max(durations):.1f}s")
+    print(f"/health samples: {len(samples)}, median {statistics.median(samples) * 1000:.0f}ms, "
+          f"p99 {samples[int(len(samples) * 0.99) - 1] * 1000:.0f}ms, max {samples[-1] * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--streams", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.streams))
@@ -1,77 +1,435 @@
 """
 Campaign Storage Service
 Handles storing and retrieving published campaign data
+
+Campaigns live in an embedded SQLite database (WAL mode):
+  - `campaigns`: one small metadata row per campaign (id, product, created_at,
+    post count, overall metrics), indexed on (created_at, campaign_id) so
+    listing is keyset-paginated and "latest" is a single index probe;
+  - `campaign_bodies`: the full campaign document, compact JSON, compressed.
+
+Documents are stored in format version 2: posts are kept once under "posts"
+(v1 duplicated them under "published_posts"). Readers get a compatibility
+view with both keys so the dashboard keeps working unchanged.
+
+Bodies start with a one-byte codec tag (raw / gzip / zstd); zstd is used
+when the optional `zstandard` package is installed, gzip otherwise.
+CAMPAIGN_COMPRESSION=zstd|gzip|none overrides the choice.
+
+Legacy per-campaign JSON files in data/campaigns are imported on first use,
+and bodies written in an older format are migrated in place.
+
+Reads can be narrowed: top-level field projection, and paged access to a
+campaign's posts and each post's comments. Saved campaigns never change, so
+recently decoded documents are kept in a small LRU.
+
+Writes are atomic: metadata and body go in one IMMEDIATE transaction with
+synchronous=FULL, so readers never see a half-written campaign, and
+BEGIN IMMEDIATE serializes writers across threads and processes. New IDs
+are ULIDs (unique and time-sortable even for same-millisecond publishes).
 """
+import base64
+import functools
+import gzip
 import json
 import os
+import sqlite3
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
 
+from services.ids import new_ulid
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
 STORAGE_DIR = Path(__file__).parent.parent / "data" / "campaigns"
 STORAGE_DIR.mkdir(parents=True, exist_ok=True)
 
+DB_PATH = Path(os.getenv("CAMPAIGN_DB_PATH", str(STORAGE_DIR.parent / "campaigns.sqlite3")))
+
+FORMAT_VERSION = 2
+
+CODEC_NONE = b"\x00"
+CODEC_GZIP = b"\x01"
+CODEC_ZSTD = b"\x02"
+COMPRESSION = os.getenv("CAMPAIGN_COMPRESSION", "zstd" if zstandard else "gzip")
+# Decoded documents kept in memory for paginated reads of the same campaign
+DOC_CACHE_SIZE = int(os.getenv("CAMPAIGN_DOC_CACHE_SIZE", "16"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaigns (
+    campaign_id        TEXT PRIMARY KEY,
+    product_name       TEXT,
+    created_at         TEXT NOT NULL,
+    total_posts        INTEGER NOT NULL DEFAULT 0,
+    total_reach        INTEGER,
+    total_engagement   INTEGER,
+    positive_sentiment REAL
+);
+CREATE INDEX IF NOT EXISTS idx_campaigns_created ON campaigns (created_at, campaign_id);
+CREATE TABLE IF NOT EXISTS campaign_bodies (
+    campaign_id TEXT PRIMARY KEY REFERENCES campaigns (campaign_id) ON DELETE CASCADE,
+    body        BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS storage_meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def _connect() -> sqlite3.Connection:
+    """Per-thread connection (handlers run on the shared worker pool)."""
+    global _initialized
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(str(DB_PATH), timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        _local.conn = conn
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                conn.executescript(SCHEMA)
+                _import_legacy_files(conn)
+                row = conn.execute("SELECT value FROM storage_meta WHERE key = 'body_format'").fetchone()
+                if not row or row[0] != _body_format():
+                    _migrate_bodies(conn)
+                _initialized = True
+    return conn
+
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection):
+    """Take the write lock up front (no deferred-upgrade deadlocks), commit or roll back."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def _compact(campaign_data: dict) -> dict:
+    """Current storage format: posts stored once, versioned."""
+    doc = dict(campaign_data)
+    legacy_posts = doc.pop("published_posts", None)
+    if "posts" not in doc and legacy_posts is not None:
+        doc["posts"] = legacy_posts
+    doc["format_version"] = FORMAT_VERSION
+    return doc
+
+
+def _compat_view(doc: dict) -> dict:
+    """Old document shape for existing readers (dashboard, clients of v1)."""
+    view = dict(doc)
+    view.pop("format_version", None)
+    view["published_posts"] = view.get("posts", [])
+    return view
+
+
+def _codec_tag() -> bytes:
+    if COMPRESSION == "zstd" and zstandard is not None:
+        return CODEC_ZSTD
+    return CODEC_NONE if COMPRESSION == "none" else CODEC_GZIP
+
+
+def _body_format() -> str:
+    return f"v{FORMAT_VERSION}:{_codec_tag().hex()}"
+
+
+def _encode_body(doc: dict) -> bytes:
+    raw = json.dumps(doc, separators=(",", ":")).encode("utf-8")
+    tag = _codec_tag()
+    if tag == CODEC_ZSTD:
+        return tag + zstandard.ZstdCompressor(level=6).compress(raw)
+    if tag == CODEC_NONE:
+        return tag + raw
+    return tag + gzip.compress(raw, compresslevel=6)
+
+
+def _decode_body(blob: bytes) -> dict:
+    tag, payload = blob[:1], blob[1:]
+    if tag == CODEC_NONE:
+        raw = payload
+    elif tag == CODEC_GZIP:
+        raw = gzip.decompress(payload)
+    elif tag == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Campaign body is zstd-compressed but zstandard is not installed")
+        raw = zstandard.ZstdDecompressor().decompress(payload)
+    else:
+        raise ValueError(f"Unknown campaign body codec tag {tag!r}")
+    return json.loads(raw)
+
+
+def _insert(conn: sqlite3.Connection, campaign_data: dict, verb: str = "INSERT") -> None:
+    campaign_data = _compact(campaign_data)
+    overall = campaign_data.get("overall", {})
+    conn.execute(
+        f"{verb} INTO campaigns (campaign_id, product_name, created_at, total_posts,"
+        " total_reach, total_engagement, positive_sentiment) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+            campaign_data["campaign_id"],
+            campaign_data.get("product", {}).get("name"),
+            campaign_data["created_at"],
+            len(campaign_data.get("posts", [])),
+            overall.get("total_reach"),
+            overall.get("total_engagement"),
+            overall.get("positive_sentiment"),
+        ),
+    )
+    conn.execute(
+        f"{verb} INTO campaign_bodies (campaign_id, body) VALUES (?, ?)",
+        (campaign_data["campaign_id"], _encode_body(campaign_data)),
+    )
+
+
+def _import_legacy_files(conn: sqlite3.Connection) -> None:
+    """One-time import of the old data/campaigns/*.json files."""
+    done = conn.execute("SELECT 1 FROM storage_meta WHERE key = 'legacy_import'").fetchone()
+    if done:
+        return
+    with _transaction(conn):
+        for file_path in sorted(STORAGE_DIR.glob("*.json")):
+            if file_path.name == "latest.json":
+                continue
+            try:
+                with open(file_path, "r") as f:
+                    data = json.load(f)
+                data.setdefault("campaign_id", file_path.stem)
+                data.setdefault("created_at", datetime.fromtimestamp(file_path.stat().st_mtime).isoformat())
+                _insert(conn, data, verb="INSERT OR IGNORE")
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[campaign_storage] Skipping legacy file {file_path.name}: {e}")
+        conn.execute(
+            "INSERT OR REPLACE INTO storage_meta (key, value) VALUES ('legacy_import', ?)",
+            (datetime.now().isoformat(),),
+        )
+
+
+def _migrate_bodies(conn: sqlite3.Connection) -> int:
+    """Rewrite bodies stored in an older format (or another codec) in the current one.
+
+    zstd bodies can't be read without zstandard; they are left as they are
+    (reading one raises) and the migration is retried on the next start.
+    """
+    migrated = unreadable = 0
+    rows = conn.execute("SELECT campaign_id, body FROM campaign_bodies").fetchall()
+    with _transaction(conn):
+        for campaign_id, blob in rows:
+            if blob[:1] == CODEC_ZSTD and zstandard is None:
+                unreadable += 1
+                continue
+            doc = _decode_body(blob)
+            if doc.get("format_version") == FORMAT_VERSION and blob[:1] == _codec_tag():
+                continue
+            conn.execute(
+                "UPDATE campaign_bodies SET body = ? WHERE campaign_id = ?",
+                (_encode_body(_compact(doc)), campaign_id),
+            )
+            migrated += 1
+        if not unreadable:
+            conn.execute(
+                "INSERT OR REPLACE INTO storage_meta (key, value) VALUES ('body_format', ?)",
+                (_body_format(),),
+            )
+    if unreadable:
+        print(f"[campaign_storage] {unreadable} campaign bodies are zstd-compressed but zstandard is not "
+              "installed; they stay unreadable until it is")
+    if migrated:
+        print(f"[campaign_storage] Migrated {migrated} campaign bodies to format v{FORMAT_VERSION}")
+    return migrated
+
+
+def migrate_campaigns() -> int:
+    """Import any legacy JSON files and bring every stored body to the current format."""
+    conn = _connect()
+    conn.execute("DELETE FROM storage_meta WHERE key = 'legacy_import'")
+    conn.commit()
+    _import_legacy_files(conn)
+    return _migrate_bodies(conn)
+
+
 def save_campaign(campaign_data: dict) -> str:
     """
     Save a campaign to storage.
     Returns the campaign ID.
     """
-    # Generate campaign ID from product name and timestamp
-    product_name = campaign_data.get("product", {}).get("name", "campaign")
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    campaign_id = f"{product_name.lower().replace(' ', '_')}_{timestamp}"
+    # ULID: unique even for same-product publishes in the same millisecond,
+    # and sorts in creation order
+    campaign_id, timestamp_ms = new_ulid()
 
     # Add metadata
     campaign_data["campaign_id"] = campaign_id
-    campaign_data["created_at"] = datetime.now().isoformat()
-
-    # Save to file
-    file_path = STORAGE_DIR / f"{campaign_id}.json"
-    with open(file_path, "w") as f:
-        json.dump(campaign_data, f, indent=2)
+    campaign_data["created_at"] = datetime.fromtimestamp(timestamp_ms / 1000).isoformat(timespec="microseconds")
 
-    # Also save as "latest" for easy retrieval
-    latest_path = STORAGE_DIR / "latest.json"
-    with open(latest_path, "w") as f:
-        json.dump(campaign_data, f, indent=2)
+    conn = _connect()
+    with _transaction(conn):
+        _insert(conn, campaign_data)
 
     return campaign_id
 
-def get_latest_campaign() -> dict | None:
+
+def _latest_id(conn: sqlite3.Connection) -> str | None:
+    row = conn.execute(
+        "SELECT campaign_id FROM campaigns ORDER BY created_at DESC, campaign_id DESC LIMIT 1"
+    ).fetchone()
+    return row[0] if row else None
+
+
+def resolve_campaign_id(campaign_id: str | None = None) -> str | None:
+    """
+    The stored campaign's ID (the latest one when campaign_id is None), or None.
+    Index-only: no body is read, so it's cheap enough for conditional requests.
+    """
+    conn = _connect()
+    if campaign_id is None:
+        return _latest_id(conn)
+    row = conn.execute("SELECT 1 FROM campaigns WHERE campaign_id = ?", (campaign_id,)).fetchone()
+    return campaign_id if row else None
+
+
+@functools.lru_cache(maxsize=DOC_CACHE_SIZE)
+def _load_doc(campaign_id: str) -> dict:
+    """Decoded body, shared between callers (campaigns are immutable once saved): don't mutate."""
+    row = _connect().execute(
+        "SELECT body FROM campaign_bodies WHERE campaign_id = ?", (campaign_id,)
+    ).fetchone()
+    if row is None:
+        raise KeyError(campaign_id)
+    return _decode_body(row[0])
+
+
+def _project(view: dict, fields: list[str] | None) -> dict:
+    if not fields:
+        return view
+    projected = {"campaign_id": view.get("campaign_id")}
+    projected.update({f: view[f] for f in fields if f in view})
+    return projected
+
+
+def get_latest_campaign(fields: list[str] | None = None) -> dict | None:
     """
-    Get the most recently saved campaign.
+    Get the most recently saved campaign, optionally only the given top-level fields.
     """
-    latest_path = STORAGE_DIR / "latest.json"
-    if not latest_path.exists():
+    campaign_id = resolve_campaign_id()
+    return get_campaign(campaign_id, fields) if campaign_id else None
+
+
+def get_campaign(campaign_id: str, fields: list[str] | None = None) -> dict | None:
+    """
+    Get a specific campaign by ID, optionally only the given top-level fields.
+    """
+    try:
+        doc = _load_doc(campaign_id)
+    except KeyError:
         return None
+    return _project(_compat_view(doc), fields)
 
-    with open(latest_path, "r") as f:
-        return json.load(f)
 
-def get_campaign(campaign_id: str) -> dict | None:
+def get_campaign_posts(
+    campaign_id: str, offset: int = 0, limit: int = 20, include_comments: bool = False
+) -> dict | None:
     """
-    Get a specific campaign by ID.
+    One page of a campaign's posts. Comments are left out unless asked for
+    (fetch them per post with get_post_comments); comment_count is always set.
     """
-    file_path = STORAGE_DIR / f"{campaign_id}.json"
-    if not file_path.exists():
+    try:
+        posts = _load_doc(campaign_id).get("posts", [])
+    except KeyError:
         return None
+    offset, limit = max(0, offset), max(1, min(limit, 100))
+    page = []
+    for index, post in enumerate(posts[offset:offset + limit], start=offset):
+        item = {k: v for k, v in post.items() if include_comments or k != "top_comments"}
+        item["index"] = index
+        item["comment_count"] = len(post.get("top_comments") or [])
+        page.append(item)
+    return {"campaign_id": campaign_id, "total": len(posts), "offset": offset, "posts": page}
 
-    with open(file_path, "r") as f:
-        return json.load(f)
 
-def list_campaigns() -> list[dict]:
+def get_post_comments(campaign_id: str, post_index: int, offset: int = 0, limit: int = 50) -> dict | None:
     """
-    List all campaigns (metadata only).
+    One page of the comments on the post at post_index, or None if either doesn't exist.
     """
-    campaigns = []
-    for file_path in STORAGE_DIR.glob("*.json"):
-        if file_path.name == "latest.json":
-            continue
-        with open(file_path, "r") as f:
-            data = json.load(f)
-            campaigns.append({
-                "campaign_id": data.get("campaign_id"),
-                "product_name": data.get("product", {}).get("name"),
-                "created_at": data.get("created_at"),
-                "total_posts": len(data.get("published_posts", []))
-            })
-    return sorted(campaigns, key=lambda x: x["created_at"], reverse=True)
+    try:
+        posts = _load_doc(campaign_id).get("posts", [])
+    except KeyError:
+        return None
+    if not 0 <= post_index < len(posts):
+        return None
+    comments = posts[post_index].get("top_comments") or []
+    offset, limit = max(0, offset), max(1, min(limit, 200))
+    return {
+        "campaign_id": campaign_id,
+        "post_index": post_index,
+        "total": len(comments),
+        "offset": offset,
+        "comments": comments[offset:offset + limit],
+    }
+
+
+def _encode_cursor(created_at: str, campaign_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([created_at, campaign_id]).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        created_at, campaign_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(created_at), str(campaign_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def list_campaigns(limit: int = 50, cursor: str | None = None) -> tuple[list[dict], str | None]:
+    """
+    List campaigns newest first (metadata only), one keyset page at a time.
+    Returns (campaigns, next_cursor); next_cursor is None on the last page.
+    """
+    limit = max(1, min(limit, 500))
+    sql = (
+        "SELECT campaign_id, product_name, created_at, total_posts,"
+        " total_reach, total_engagement, positive_sentiment FROM campaigns"
+    )
+    params: tuple = ()
+    if cursor:
+        sql += " WHERE (created_at, campaign_id) < (?, ?)"
+        params = _decode_cursor(cursor)
+    sql += " ORDER BY created_at DESC, campaign_id DESC LIMIT ?"
+    rows = _connect().execute(sql, params + (limit + 1,)).fetchall()
+
+    campaigns = [
+        {
+            "campaign_id": r[0],
+            "product_name": r[1],
+            "created_at": r[2],
+            "total_posts": r[3],
+            "overall": {
+                "total_reach": r[4],
+                "total_engagement": r[5],
+                "positive_sentiment": r[6],
+            },
+        }
+        for r in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        last = campaigns[-1]
+        next_cursor = _encode_cursor(last["created_at"], last["campaign_id"])
+    return campaigns, next_cursor
+
+
+if __name__ == "__main__":
+    # python -m services.campaign_storage
+    print(f"Migrated {migrate_campaigns()} campaign(s) in {DB_PATH}")
@@ -0,0 +1,113 @@
+"""
+Batch sentiment classification for generated comments
+
+Instead of one request per comment, comments are classified in chunks with
+a single structured request each: the model returns a JSON array of
+{"id", "sentiment"} objects. Anything the batch response fails to cover (bad
+JSON, missing ids, unknown labels) falls back to the one-comment prompt for
+just those items.
+"""
+
+import asyncio
+import json
+import os
+
+from services.llm_scheduler import LANE_BACKGROUND, create_message
+
+SENTIMENT_MODEL = "claude-sonnet-4-20250514"
+BATCH_SIZE = int(os.getenv("SENTIMENT_BATCH_SIZE", "40"))
+LABELS = ("positive", "neutral", "negative")
+
+BATCH_PROMPT = """Classify the sentiment of each Reddit comment below as 'positive', 'neutral', or 'negative'.
+
+Return ONLY a JSON array with one object per comment, in any order, using the comment's id:
+[{{"id": 0, "sentiment": "positive"}}, {{"id": 1, "sentiment": "negative"}}]
+No markdown, no backticks, no explanation.
+
+Comments:
+{comments}"""
+
+SINGLE_PROMPT = "Analyze the sentiment of this comment. Reply with ONLY one word: 'positive', 'neutral', or 'negative'.\n\nComment: {body}"
+
+
+def _normalize_label(text: str) -> str | None:
+    text = str(text).strip().lower()
+    if text in LABELS:
+        return text
+    for label in LABELS:
+        if label in text:
+            return label
+    return None
+
+
+def _parse_batch(raw: str, ids: list[int]) -> dict[int, str]:
+    """Labels by id from a batch response; ids that can't be recovered are left out."""
+    start, end = raw.find("["), raw.rfind("]")
+    if start == -1 or end <= start:
+        return {}
+    try:
+        items = json.loads(raw[start:end + 1])
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(items, list):
+        return {}
+
+    wanted = set(ids)
+    labels = {}
+    for position, item in enumerate(items):
+        if isinstance(item, dict):
+            item_id, label = item.get("id"), _normalize_label(item.get("sentiment", ""))
+        else:
+            # Bare label list: trust the order only if the length matches
+            item_id = ids[position] if len(items) == len(ids) else None
+            label = _normalize_label(item)
+        if isinstance(item_id, str) and item_id.isdigit():
+            item_id = int(item_id)
+        if isinstance(item_id, int) and item_id in wanted and label:
+            labels[item_id] = label
+    return labels
+
+
+async def _classify_batch(batch: list[tuple[int, str]], api_key: str) -> dict[int, str]:
+    lines = "\n".join(json.dumps({"id": i, "comment": body}) for i, body in batch)
+    try:
+        response = await create_message(
+            api_key,
+            lane=LANE_BACKGROUND,
+            model=SENTIMENT_MODEL,
+            max_tokens=20 * len(batch) + 50,
+            messages=[{"role": "user", "content": BATCH_PROMPT.format(comments=lines)}],
+        )
+        return _parse_batch(response.content[0].text, [i for i, _ in batch])
+    except Exception as e:
+        print(f"[sentiment] Batch of {len(batch)} failed, falling back per comment: {e}")
+        return {}
+
+
+async def _classify_one(body: str, api_key: str) -> str:
+    response = await create_message(
+        api_key,
+        lane=LANE_BACKGROUND,
+        model=SENTIMENT_MODEL,
+        max_tokens=10,
+        messages=[{"role": "user", "content": SINGLE_PROMPT.format(body=body)}],
+    )
+    text = response.content[0].text
+    return _normalize_label(text) or text.strip().lower()
+
+
+async def classify_sentiments(bodies: list[str], api_key: str = "") -> list[str]:
+    """One label per comment body, in input order."""
+    items = list(enumerate(bodies))
+    chunks = [items[i:i + BATCH_SIZE] for i in range(0, len(items), BATCH_SIZE)]
+    labels: dict[int, str] = {}
+    for result in await asyncio.gather(*[_classify_batch(chunk, api_key) for chunk in chunks]):
+        labels.update(result)
+
+    missing = [i for i, _ in items if i not in labels]
+    if missing:
+        print(f"[sentiment] {len(missing)}/{len(items)} comments not covered by batch, retrying individually")
+        singles = await asyncio.gather(*[_classify_one(bodies[i], api_key) for i in missing])
+        labels.update(zip(missing, singles))
+
+    return [labels[i] for i, _ in items]
@@ -0,0 +1,162 @@
+"""
+Sentence embedding model lifecycle
+
+Importing this module is cheap: the embedding backend (and with it torch or
+onnxruntime) is only imported when the model is first needed, so the API can
+boot and answer /health without paying for it. The FastAPI lifespan hook can
+start warm_up() in the background (EMBED_WARMUP=0 disables it), and /ready
+reports the model state:
+
+  cold -> loading -> ready      (or failed, with the error)
+
+Backends (EMBED_BACKEND), both producing all-MiniLM-L6-v2 sentence vectors:
+  - torch: sentence_transformers on PyTorch (default);
+  - onnx:  an int8-quantized ONNX export run with onnxruntime + tokenizers,
+           no torch import. Export it once with scripts/export_onnx_embedder.py
+           and check it against torch with scripts/check_embedding_parity.py.
+
+Each backend has its own embedding-store namespace, so vectors from
+different backends never mix.
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+
+from services.embedding_store import EmbeddingStore, encode_cached
+
+load_dotenv()
+
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch").lower()
+ONNX_MODEL_DIR = Path(os.getenv(
+    "ONNX_MODEL_DIR", str(Path(__file__).parent.parent / "data" / "models" / f"{EMBED_MODEL_NAME}-onnx-int8")
+))
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))  # 0 = onnxruntime default
+MAX_SEQ_LENGTH = 256  # all-MiniLM-L6-v2's max_seq_length
+WARMUP_ON_STARTUP = os.getenv("EMBED_WARMUP", "1") != "0"
+
+# Lazy-loaded globals (initialized from worker threads, hence the lock)
+_model = None
+_store = None
+_lock = threading.Lock()
+_state = {"status": "cold", "error": None, "load_seconds": None}
+
+
+class OnnxEmbedder:
+    """all-MiniLM-L6-v2 as an ONNX graph: tokenize, run, mean-pool, normalize.
+
+    Implements the slice of the SentenceTransformer interface the scorer
+    uses (encode / get_sentence_embedding_dimension).
+    """
+
+    def __init__(self, model_dir: Path):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_path, tokenizer_path = model_dir / "model.onnx", model_dir / "tokenizer.json"
+        if not model_path.exists() or not tokenizer_path.exists():
+            raise FileNotFoundError(
+                f"No ONNX export in {model_dir}; run python scripts/export_onnx_embedder.py"
+            )
+        self.tokenizer = Tokenizer.from_file(str(tokenizer_path))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+        options = ort.SessionOptions()
+        if ONNX_THREADS:
+            options.intra_op_num_threads = ONNX_THREADS
+        self.session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.dim = int(self.encode(["dimension probe"]).shape[1])
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, texts: list[str], batch_size: int = 64, normalize_embeddings: bool = True, **_) -> np.ndarray:
+        chunks = []
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            ids = np.array([e.ids for e in encodings], dtype=np.int64)
+            mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feed = {"input_ids": ids, "attention_mask": mask}
+            if "token_type_ids" in self.input_names:
+                feed["token_type_ids"] = np.zeros_like(ids)
+            hidden = self.session.run(None, feed)[0]
+            weights = mask[..., None].astype(np.float32)
+            chunks.append((hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None))
+        embeddings = np.concatenate(chunks).astype(np.float32) if chunks else np.zeros((0, self.dim), np.float32)
+        if normalize_embeddings:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings
+
+
+def _load_backend():
+    if EMBED_BACKEND == "onnx":
+        return OnnxEmbedder(ONNX_MODEL_DIR)
+    if EMBED_BACKEND != "torch":
+        raise ValueError(f"Unknown EMBED_BACKEND {EMBED_BACKEND!r} (expected torch or onnx)")
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(EMBED_MODEL_NAME)
+
+
+def store_name() -> str:
+    """Embedding-store namespace: vectors are only reused within one backend."""
+    return EMBED_MODEL_NAME if EMBED_BACKEND == "torch" else f"{EMBED_MODEL_NAME}-{EMBED_BACKEND}-int8"
+
+
+def get_model():
+    """The configured embedding backend, imported and loaded on first use."""
+    global _model
+    if _model is not None:
+        return _model
+    with _lock:
+        if _model is None:
+            _state["status"] = "loading"
+            started = time.perf_counter()
+            try:
+                _model = _load_backend()
+            except Exception as e:
+                _state.update(status="failed", error=str(e))
+                raise
+            _state.update(status="ready", error=None, load_seconds=round(time.perf_counter() - started, 3))
+            print(f"[embeddings] Loaded {EMBED_MODEL_NAME} ({EMBED_BACKEND}) in {_state['load_seconds']}s")
+    return _model
+
+
+def get_store() -> EmbeddingStore | None:
+    """Persistent text-hash -> vector cache; disabled with EMBEDDING_CACHE=0."""
+    global _store
+    if os.getenv("EMBEDDING_CACHE", "1") == "0":
+        return None
+    model = get_model()
+    with _lock:
+        if _store is None:
+            _store = EmbeddingStore(store_name(), model.get_sentence_embedding_dimension())
+    return _store
+
+
+def embed(texts: list[str]) -> np.ndarray:
+    """Normalized embeddings for `texts`, skipping those already in the store."""
+    return encode_cached(get_model(), store_name(), texts, get_store())
+
+
+def warm_up() -> None:
+    """Load the model and store and run one encode so the first request is hot (blocking)."""
+    try:
+        get_store()
+        get_model().encode(["warm up"], normalize_embeddings=True)
+    except Exception as e:
+        print(f"[embeddings] Warm-up failed: {e}")
+
+
+def is_ready() -> bool:
+    return _state["status"] == "ready"
+
+
+def status() -> dict:
+    return {"model": EMBED_MODEL_NAME, "backend": EMBED_BACKEND, **_state}
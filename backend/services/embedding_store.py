@@ -0,0 +1,143 @@
+"""
+Persistent embedding store
+
+Embeddings are keyed by a SHA-256 of (model name, text) and kept as float32
+rows in an append-only, memory-mapped array file per model:
+
+    data/embeddings/<model>.f32    raw float32 rows, shape (N, dim)
+    data/embeddings/<model>.keys   one hex key per line; line i <-> row i
+
+Both files are only ever appended to, so a crash can at worst leave a torn
+tail, which is ignored on load. Only texts whose key is missing are sent to
+the model.
+
+Several processes may share the store (uvicorn workers, the scripts), so
+loading and appending hold an exclusive flock on <model>.lock, and an
+append first re-reads rows other processes added since this one last looked.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; single-process use only there
+    fcntl = None
+
+STORE_DIR = Path(os.getenv("EMBEDDING_CACHE_DIR", str(Path(__file__).parent.parent / "data" / "embeddings")))
+
+
+def text_key(model_name: str, text: str) -> str:
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    def __init__(self, model_name: str, dim: int, directory: Path = STORE_DIR):
+        self.model_name = model_name
+        self.dim = dim
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        directory.mkdir(parents=True, exist_ok=True)
+        self._vec_path = directory / f"{slug}.f32"
+        self._key_path = directory / f"{slug}.keys"
+        self._lock_path = directory / f"{slug}.lock"
+        self._lock = threading.Lock()
+        self._index: dict[str, int] = {}
+        self._matrix = None
+        with self._lock, self._file_lock():
+            self._load()
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive inter-process lock on the store files."""
+        if fcntl is None:
+            yield
+            return
+        with open(self._lock_path, "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _rows_on_disk(self) -> int:
+        return self._vec_path.stat().st_size // (self.dim * 4) if self._vec_path.exists() else 0
+
+    def _load(self) -> None:
+        """(Re)read both files, truncating a torn tail (caller holds both locks)."""
+        keys = []
+        if self._key_path.exists():
+            keys = [line for line in self._key_path.read_text().splitlines() if len(line) == 64]
+        row_bytes = self.dim * 4
+        rows = self._rows_on_disk()
+        n = min(len(keys), rows)
+        if n < len(keys) or n < rows:
+            # Torn append from a previous crash: truncate both files to the consistent prefix
+            with open(self._vec_path, "r+b" if self._vec_path.exists() else "wb") as f:
+                f.truncate(n * row_bytes)
+            self._key_path.write_text("".join(k + "\n" for k in keys[:n]))
+        self._index = {k: i for i, k in enumerate(keys[:n])}
+        self._remap(n)
+
+    def _remap(self, n: int) -> None:
+        self._matrix = (
+            np.memmap(self._vec_path, dtype=np.float32, mode="r", shape=(n, self.dim)) if n else None
+        )
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get_many(self, keys: list[str]) -> dict[str, np.ndarray]:
+        with self._lock:
+            return {k: np.array(self._matrix[self._index[k]]) for k in keys if k in self._index}
+
+    def add_many(self, keys: list[str], vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            if all(k in self._index for k in keys):
+                return
+            with self._file_lock():
+                if self._rows_on_disk() != len(self._index):
+                    # Another process appended since we last looked: pick up its rows
+                    self._load()
+                fresh = {}
+                for k, v in zip(keys, vectors):
+                    if k not in self._index and k not in fresh:
+                        fresh[k] = v
+                if not fresh:
+                    return
+                start = self._rows_on_disk()
+                with open(self._vec_path, "ab") as f:
+                    f.write(np.stack(list(fresh.values())).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                with open(self._key_path, "a") as f:
+                    f.write("".join(k + "\n" for k in fresh))
+            for i, k in enumerate(fresh):
+                self._index[k] = start + i
+            self._remap(len(self._index))
+
+
+def encode_cached(model, model_name: str, texts: list[str], store: EmbeddingStore | None) -> np.ndarray:
+    """Normalized float32 embeddings for `texts`, encoding only cache misses."""
+    if store is None:
+        return model.encode(texts, batch_size=64, normalize_embeddings=True, convert_to_numpy=True)
+
+    keys = [text_key(model_name, t) for t in texts]
+    found = store.get_many(keys)
+    missing = {}
+    for k, t in zip(keys, texts):
+        if k not in found and k not in missing:
+            missing[k] = t
+    if missing:
+        vectors = model.encode(
+            list(missing.values()), batch_size=64, normalize_embeddings=True, convert_to_numpy=True
+        )
+        store.add_many(list(missing.keys()), vectors)
+        found.update(zip(missing.keys(), np.asarray(vectors, dtype=np.float32)))
+    return np.stack([found[k] for k in keys])
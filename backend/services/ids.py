@@ -0,0 +1,44 @@
+"""
+ULID generation
+
+26-character, Crockford base32, lexicographically sortable IDs: 48 bits of
+millisecond timestamp followed by 80 random bits. IDs generated within the
+same millisecond increment the random part, so they stay unique and
+ordered even under bursts from many threads.
+"""
+
+import os
+import threading
+import time
+
+_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+_lock = threading.Lock()
+_last_ms = -1
+_last_rand = 0
+
+
+def _encode(value: int, length: int) -> str:
+    chars = []
+    for _ in range(length):
+        value, rem = divmod(value, 32)
+        chars.append(_ALPHABET[rem])
+    return "".join(reversed(chars))
+
+
+def new_ulid() -> tuple[str, int]:
+    """Return (ulid, timestamp_ms)."""
+    global _last_ms, _last_rand
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms <= _last_ms:
+            # Same (or a backwards-stepped) millisecond: stay monotonic
+            now_ms = _last_ms
+            _last_rand += 1
+            if _last_rand >= 1 << 80:
+                now_ms += 1
+                _last_rand = int.from_bytes(os.urandom(10), "big") >> 1
+        else:
+            _last_rand = int.from_bytes(os.urandom(10), "big") >> 1
+        _last_ms = now_ms
+        return _encode(now_ms, 10) + _encode(_last_rand, 16), now_ms
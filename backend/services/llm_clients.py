@@ -0,0 +1,153 @@
+"""
+Shared Anthropic client registry
+
+One sync and one async client per API key (the x-anthropic-key header value,
+or ANTHROPIC_API_KEY), each with its own tuned keep-alive connection pool,
+so the dozens of calls in a scrape or publish reuse warm TLS connections
+instead of handshaking per call. Least-recently-used keys are evicted once
+the registry is full, and keys idle for longer than LLM_CLIENT_IDLE_TTL are
+evicted on the next access. Eviction only drops the registry entry: callers
+hold their client through queueing and retries, so an evicted client is not
+closed under them. It is released once the last caller lets go of it, and
+any still alive at shutdown are closed then.
+
+Async clients are bound to the event loop they were created on, so they are
+registered per (key, loop).
+"""
+
+import asyncio
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import httpx
+from anthropic import Anthropic, AsyncAnthropic, DefaultAsyncHttpxClient, DefaultHttpxClient
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MAX_CLIENTS = int(os.getenv("LLM_CLIENT_CACHE_SIZE", "32"))
+IDLE_TTL = float(os.getenv("LLM_CLIENT_IDLE_TTL", "900"))
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+
+_LIMITS = httpx.Limits(
+    max_connections=MAX_CONNECTIONS,
+    max_keepalive_connections=min(MAX_CONNECTIONS, 20),
+    keepalive_expiry=60.0,
+)
+_TIMEOUT = httpx.Timeout(600.0, connect=10.0)
+
+# key -> [client, last_used]
+_sync_clients: OrderedDict[str, list] = OrderedDict()
+# (key, id(loop)) -> [client, last_used, loop]
+_async_clients: OrderedDict[tuple, list] = OrderedDict()
+# Evicted clients possibly still in use: closed at shutdown if still alive
+_evicted_sync: "weakref.WeakSet[Anthropic]" = weakref.WeakSet()
+_evicted_async: "weakref.WeakKeyDictionary[AsyncAnthropic, asyncio.AbstractEventLoop]" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def resolve_key(api_key: str) -> str:
+    """The key a call will actually use (the request's, else ANTHROPIC_API_KEY)."""
+    return api_key or os.getenv("ANTHROPIC_API_KEY", "")
+
+
+def _close_async(client: AsyncAnthropic, loop: asyncio.AbstractEventLoop) -> None:
+    """Close an async client on its own loop, or just drop it if that loop is gone."""
+    if loop.is_closed():
+        return
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        loop.create_task(client.close())
+    elif loop.is_running():
+        loop.call_soon_threadsafe(lambda: loop.create_task(client.close()))
+
+
+def _evict(now: float) -> None:
+    """Unregister idle and over-capacity clients without closing them (caller holds _lock)."""
+    for registry in (_sync_clients, _async_clients):
+        stale = [k for k, entry in registry.items() if now - entry[1] > IDLE_TTL]
+        while len(registry) - len(stale) > MAX_CLIENTS:
+            oldest = next(k for k in registry if k not in stale)
+            stale.append(oldest)
+        for k in stale:
+            entry = registry.pop(k)
+            if registry is _sync_clients:
+                _evicted_sync.add(entry[0])
+            else:
+                _evicted_async[entry[0]] = entry[2]
+
+
+def get_client(api_key: str = "") -> Anthropic:
+    key = resolve_key(api_key)
+    now = time.monotonic()
+    with _lock:
+        entry = _sync_clients.get(key)
+        if entry is None:
+            client = Anthropic(
+                api_key=key,
+                http_client=DefaultHttpxClient(limits=_LIMITS, timeout=_TIMEOUT),
+            )
+            entry = _sync_clients[key] = [client, now]
+        entry[1] = now
+        _sync_clients.move_to_end(key)
+        _evict(now)
+        return entry[0]
+
+
+def get_async_client(api_key: str = "") -> AsyncAnthropic:
+    key = resolve_key(api_key)
+    loop = asyncio.get_running_loop()
+    registry_key = (key, id(loop))
+    now = time.monotonic()
+    with _lock:
+        entry = _async_clients.get(registry_key)
+        if entry is not None and entry[2] is not loop:
+            # id() reused by a new loop after the old one was collected
+            del _async_clients[registry_key]
+            entry = None
+        if entry is None:
+            client = AsyncAnthropic(
+                api_key=key,
+                http_client=DefaultAsyncHttpxClient(limits=_LIMITS, timeout=_TIMEOUT),
+            )
+            entry = _async_clients[registry_key] = [client, now, loop]
+        entry[1] = now
+        _async_clients.move_to_end(registry_key)
+        _evict(now)
+        return entry[0]
+
+
+# ------------------------------------------------------------------
+# FastAPI lifecycle hooks
+# ------------------------------------------------------------------
+
+async def startup() -> None:
+    """Create the default-key clients up front so the first request doesn't pay for it."""
+    if os.getenv("ANTHROPIC_API_KEY"):
+        get_client()
+        get_async_client()
+
+
+async def shutdown() -> None:
+    """Close every registered client; async ones on the current loop are awaited."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        sync_entries = list(_sync_clients.values()) + [[c, 0.0] for c in list(_evicted_sync)]
+        async_entries = list(_async_clients.values()) + [[c, 0.0, l] for c, l in list(_evicted_async.items())]
+        _sync_clients.clear()
+        _async_clients.clear()
+        _evicted_sync.clear()
+        _evicted_async.clear()
+    for client, _ in sync_entries:
+        client.close()
+    for client, _, client_loop in async_entries:
+        if client_loop is loop:
+            await client.close()
+        else:
+            _close_async(client, client_loop)
@@ -0,0 +1,378 @@
+"""
+Global LLM request scheduler
+
+Every Anthropic call in the backend goes through create_message() (async),
+stream_message() (async, token deltas) or create_message_sync() (worker
+threads). Users bring their own API key, and with it their own provider
+quota, so state is kept per (API key, model). For each, the scheduler
+enforces:
+
+  - a concurrency limit, handed out by priority lane, so interactive
+    discover/generate/scrape calls jump ahead of background publish
+    simulation when the model is saturated;
+  - a tokens-per-minute budget (token bucket over estimated, then actual,
+    input + output tokens);
+  - 429/529-aware backoff: a rate-limited response pauses that key's budget
+    for the model for the server-suggested delay instead of letting every
+    caller retry on its own (other keys are unaffected).
+
+Prompt builders mark their static prefixes with cached_block() so repeated
+system prompts / shared context are served from Anthropic's prompt cache;
+cache reads and writes are tallied per model (summed over keys) in stats().
+
+Limits apply to each key separately. They default to LLM_MAX_CONCURRENCY /
+LLM_TOKENS_PER_MINUTE and can be overridden per model with LLM_LIMITS='{"claude-sonnet-4-6": {"concurrency": 4, "tpm": 80000}}'.
+"""
+
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+
+import anthropic
+from dotenv import load_dotenv
+
+from services.llm_clients import IDLE_TTL, get_async_client, get_client, resolve_key
+from services.rate_limit import TokenBucket
+
+load_dotenv()
+
+LANE_INTERACTIVE = 0
+LANE_BACKGROUND = 1
+
+DEFAULT_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+DEFAULT_TPM = int(os.getenv("LLM_TOKENS_PER_MINUTE", "400000"))
+MODEL_LIMITS = json.loads(os.getenv("LLM_LIMITS", "{}"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504, 529}
+
+
+class _Waiter:
+    __slots__ = ("priority", "loop", "future", "event", "granted", "cancelled")
+
+    def __init__(self, priority: int, loop=None, future=None, event=None):
+        self.priority = priority
+        self.loop = loop
+        self.future = future
+        self.event = event
+        self.granted = False
+        self.cancelled = False
+
+    def wake(self) -> None:
+        if self.event is not None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class PrioritySlots:
+    """Counting semaphore whose waiters are served lowest-lane-first, FIFO within a lane.
+
+    Thread- and loop-agnostic: async waiters are woken on their own loop,
+    sync waiters through a threading.Event.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.active = 0
+        self._waiters: list[tuple[int, int, _Waiter]] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _try_acquire(self, waiter: _Waiter) -> bool:
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                return True
+            heapq.heappush(self._waiters, (waiter.priority, next(self._seq), waiter))
+            return False
+
+    def _cancel(self, waiter: _Waiter) -> None:
+        with self._lock:
+            waiter.cancelled = True
+            if waiter.granted:
+                # The slot was handed over as we gave up; pass it on
+                self._release_locked()
+
+    def _release_locked(self) -> None:
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if waiter.cancelled:
+                continue
+            waiter.granted = True
+            waiter.wake()
+            return
+        self.active -= 1
+
+    async def acquire(self, priority: int) -> None:
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(priority, loop=loop, future=loop.create_future())
+        if self._try_acquire(waiter):
+            return
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            self._cancel(waiter)
+            raise
+
+    def acquire_sync(self, priority: int) -> None:
+        waiter = _Waiter(priority, event=threading.Event())
+        if self._try_acquire(waiter):
+            return
+        waiter.event.wait()
+
+    def release(self) -> None:
+        with self._lock:
+            self._release_locked()
+
+
+class _ModelState:
+    def __init__(self, model: str):
+        self.model = model
+        self.last_used = time.monotonic()
+        limits = MODEL_LIMITS.get(model, {})
+        tpm = float(limits.get("tpm", DEFAULT_TPM))
+        self.slots = PrioritySlots(int(limits.get("concurrency", DEFAULT_CONCURRENCY)))
+        # Allow a burst of ~10s worth of budget
+        self.budget = TokenBucket(tpm / 60.0, max(tpm / 6.0, 1.0))
+        self.stats = {
+            "requests": 0,
+            "errors": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cache_read_tokens": 0,
+            "cache_creation_tokens": 0,
+            "queue_wait_s": 0.0,
+        }
+
+
+# (sha256 of the API key, model) -> state; the raw key is never kept here
+_models: dict[tuple[str, str], _ModelState] = {}
+# Counters of states dropped after going idle, so stats() totals don't shrink
+_retired: dict[str, dict] = {}
+_models_lock = threading.Lock()
+
+
+def _evict_idle(now: float) -> None:
+    """Drop states idle for LLM_CLIENT_IDLE_TTL with nothing running or queued (caller holds _models_lock)."""
+    for key, state in list(_models.items()):
+        if now - state.last_used > IDLE_TTL and not state.slots.active and not state.slots.queued:
+            retired = _retired.setdefault(state.model, {})
+            for name, value in state.stats.items():
+                retired[name] = retired.get(name, 0) + value
+            del _models[key]
+
+
+def _state(api_key: str, model: str) -> _ModelState:
+    key_hash = hashlib.sha256(resolve_key(api_key).encode("utf-8")).hexdigest()
+    now = time.monotonic()
+    with _models_lock:
+        state = _models.get((key_hash, model))
+        if state is None:
+            _evict_idle(now)
+            state = _models[(key_hash, model)] = _ModelState(model)
+        state.last_used = now
+        return state
+
+
+def cached_block(text: str) -> dict:
+    """Text content block ending a cacheable prefix: everything up to and including it is cached.
+
+    Put it after static instructions and shared context, before the parts
+    that vary per call. Prefixes shorter than the model's minimum cacheable
+    length are simply not cached.
+    """
+    return {"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}
+
+
+def _estimate_tokens(kwargs: dict) -> int:
+    """Rough pre-flight estimate (~4 chars/token) plus the output allowance."""
+    chars = len(json.dumps(kwargs.get("system", ""), default=str))
+    chars += len(json.dumps(kwargs.get("messages", []), default=str))
+    return chars // 4 + int(kwargs.get("max_tokens", 0))
+
+
+def _settle(state: _ModelState, estimate: int, response) -> None:
+    """Replace the estimate with the real usage in the budget and stats."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+    cache_creation = getattr(usage, "cache_creation_input_tokens", None) or 0
+    # input_tokens excludes cached segments; cache reads don't count against
+    # the input rate limit, cache writes do
+    actual = (usage.input_tokens or 0) + cache_creation + (usage.output_tokens or 0)
+    if actual < estimate:
+        state.budget.refund(estimate - actual)
+    elif actual > estimate:
+        state.budget.reserve(actual - estimate)
+    state.stats["input_tokens"] += usage.input_tokens or 0
+    state.stats["output_tokens"] += usage.output_tokens or 0
+    state.stats["cache_read_tokens"] += cache_read
+    state.stats["cache_creation_tokens"] += cache_creation
+
+
+def _after_failure(state: _ModelState, error: Exception, attempt: int) -> float | None:
+    """Account a failed attempt: seconds to sleep before retrying, or None to give up."""
+    delay = _retry_delay(error, attempt)
+    if delay is None or attempt == MAX_RETRIES:
+        state.stats["errors"] += 1
+        return None
+    state.stats["retries"] += 1
+    if isinstance(error, anthropic.APIStatusError) and error.status_code in (429, 529):
+        # Everyone on this key and model backs off through the budget, not just this caller
+        state.stats["rate_limited"] += 1
+        state.budget.pause(delay)
+        return 0.0
+    return delay
+
+
+def _retry_delay(error: Exception, attempt: int) -> float | None:
+    """Seconds to wait before retrying `error`, or None if it isn't retryable."""
+    if isinstance(error, anthropic.APIConnectionError):
+        return 0.5 * (2 ** attempt) + random.uniform(0, 0.5)
+    if not isinstance(error, anthropic.APIStatusError) or error.status_code not in RETRY_STATUSES:
+        return None
+    try:
+        return float(error.response.headers["retry-after"])
+    except (KeyError, ValueError):
+        return 1.0 * (2 ** attempt) + random.uniform(0, 1.0)
+
+
+async def create_message(api_key: str = "", *, lane: int = LANE_INTERACTIVE, **kwargs):
+    """Scheduled equivalent of AsyncAnthropic().messages.create(**kwargs)."""
+    state = _state(api_key, kwargs["model"])
+    client = get_async_client(api_key).with_options(max_retries=0)
+    estimate = _estimate_tokens(kwargs)
+
+    for attempt in range(MAX_RETRIES + 1):
+        queued_at = time.monotonic()
+        await state.budget.acquire(estimate)
+        await state.slots.acquire(lane)
+        state.stats["queue_wait_s"] += time.monotonic() - queued_at
+        try:
+            state.stats["requests"] += 1
+            response = await client.messages.create(**kwargs)
+        except Exception as e:
+            state.budget.refund(estimate)
+            delay = _after_failure(state, e, attempt)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            continue
+        finally:
+            state.slots.release()
+        _settle(state, estimate, response)
+        return response
+
+
+async def stream_message(api_key: str = "", *, lane: int = LANE_INTERACTIVE, **kwargs):
+    """Scheduled streaming call: an async generator of text deltas.
+
+    Holds the model slot until the stream ends (or the consumer stops).
+    Failures are retried only before the first token has been yielded.
+    """
+    state = _state(api_key, kwargs["model"])
+    client = get_async_client(api_key).with_options(max_retries=0)
+    estimate = _estimate_tokens(kwargs)
+
+    for attempt in range(MAX_RETRIES + 1):
+        queued_at = time.monotonic()
+        await state.budget.acquire(estimate)
+        await state.slots.acquire(lane)
+        state.stats["queue_wait_s"] += time.monotonic() - queued_at
+        streamed = False
+        try:
+            state.stats["requests"] += 1
+            async with client.messages.stream(**kwargs) as stream:
+                async for text in stream.text_stream:
+                    streamed = True
+                    yield text
+                response = await stream.get_final_message()
+        except Exception as e:
+            state.budget.refund(estimate)
+            delay = None if streamed else _after_failure(state, e, attempt)
+            if delay is None:
+                if streamed:
+                    state.stats["errors"] += 1
+                raise
+            await asyncio.sleep(delay)
+            continue
+        finally:
+            state.slots.release()
+        _settle(state, estimate, response)
+        return
+
+
+def create_message_sync(api_key: str = "", *, lane: int = LANE_INTERACTIVE, **kwargs):
+    """Blocking variant of create_message() for code running on worker threads."""
+    state = _state(api_key, kwargs["model"])
+    client = get_client(api_key).with_options(max_retries=0)
+    estimate = _estimate_tokens(kwargs)
+
+    for attempt in range(MAX_RETRIES + 1):
+        queued_at = time.monotonic()
+        state.budget.acquire_sync(estimate)
+        state.slots.acquire_sync(lane)
+        state.stats["queue_wait_s"] += time.monotonic() - queued_at
+        try:
+            state.stats["requests"] += 1
+            response = client.messages.create(**kwargs)
+        except Exception as e:
+            state.budget.refund(estimate)
+            delay = _after_failure(state, e, attempt)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            continue
+        finally:
+            state.slots.release()
+        _settle(state, estimate, response)
+        return response
+
+
+def _cache_hit_rate(counters: dict) -> float:
+    """Share of prompt tokens served from the prompt cache."""
+    total = counters["input_tokens"] + counters["cache_read_tokens"] + counters["cache_creation_tokens"]
+    return round(counters["cache_read_tokens"] / total, 3) if total else 0.0
+
+
+def stats() -> dict:
+    """Per-model counters summed over API keys; `limit` is per key."""
+    with _models_lock:
+        states = list(_models.values())
+        totals = {model: dict(counters) for model, counters in _retired.items()}
+    per_model = {}
+    for state in states:
+        counters = totals.setdefault(state.model, {})
+        for name, value in state.stats.items():
+            counters[name] = counters.get(name, 0) + value
+        live = per_model.setdefault(state.model, {"keys": 0, "active": 0, "queued": 0, "limit": state.slots.limit})
+        live["keys"] += 1
+        live["active"] += state.slots.active
+        live["queued"] += state.slots.queued
+    return {
+        model: {
+            **{k: round(v, 3) if isinstance(v, float) else v for k, v in counters.items()},
+            **per_model.get(model, {"keys": 0, "active": 0, "queued": 0}),
+            "cache_hit_rate": _cache_hit_rate(counters),
+        }
+        for model, counters in totals.items()
+    }
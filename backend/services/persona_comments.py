@@ -1,115 +1,231 @@
 """
 Persona Comment Generator
 Generates realistic Reddit comments based on user personas
+
+By default the comments for a post are written in batches: one request
+carries the post once plus up to COMMENT_BATCH_SIZE persona profiles and
+asks for a JSON array of {"id", "comment"} objects. The reply is validated
+per persona; only the personas whose comment is missing or malformed are
+re-requested (as a smaller batch, then one at a time as a last resort).
+COMMENT_BATCHING=0 goes back to one request per persona.
 """
 import json
-import random
-from pathlib import Path
-from anthropic import Anthropic, AsyncAnthropic
 import os
+import random
+from services.llm_scheduler import LANE_BACKGROUND, cached_block, create_message, create_message_sync
+from services.persona_registry import Persona, get_registry
 from dotenv import load_dotenv
 import asyncio
 
 load_dotenv()
 
-# Load personas
-PERSONAS_PATH = Path(__file__).parent.parent / "personas.json"
-with open(PERSONAS_PATH, "r") as f:
-    PERSONAS = json.load(f)["personas"]
-
-COMMENT_GENERATION_PROMPT = """You are simulating a Reddit comment from a specific persona responding to a post.
+COMMENT_MODEL = "claude-sonnet-4-20250514"
+COMMENT_BATCHING = os.getenv("COMMENT_BATCHING", "1") != "0"
+COMMENT_BATCH_SIZE = int(os.getenv("COMMENT_BATCH_SIZE", "15"))
+BATCH_RETRIES = 1
 
-POST DETAILS:
-Subreddit: {subreddit}
-Post Type: {post_type}
-Post Title: {title}
-Post Body: {body}
-
-PERSONA PROFILE:
-Name: {persona_name}
-Age: {age}, Gender: {gender}
-Occupation: {occupation}
-Wealth Level: {wealth}
-Attitude: {attitude}
-Communication Style: {communication_style}
-Typical Sentiment: {typical_sentiment}
-Interests: {interests}
-Reddit Behavior: {reddit_behavior}
+# Prompt layout, most static first so it can be served from the prompt cache:
+#   system: COMMENT_SYSTEM_PROMPT (identical for every call)    [cached]
+#   user:   POST_CONTEXT (identical for every persona of a post) [cached]
+#           persona profile(s) + output instructions             [varies]
+COMMENT_SYSTEM_PROMPT = """You are simulating Reddit comments from specific personas responding to a post.
 
-TASK:
-Write a single, authentic Reddit comment from this persona responding to the post above. The comment should:
+Every comment you write should:
 1. Match the persona's communication style, sentiment tendencies, and interests
 2. Feel natural and conversational (50-150 words)
 3. Reflect their attitude towards products
 4. NOT break character or mention being a persona
 5. Be a realistic Reddit comment - it can be supportive, critical, questioning, humorous, etc.
+When writing for several personas, comments must be independent of each other - personas don't see each other's replies."""
+
+POST_CONTEXT = """POST DETAILS:
+Subreddit: {subreddit}
+Post Type: {post_type}
+Post Title: {title}
+Post Body: {body}"""
+
+# Persona profiles / batch blocks are pre-rendered by the persona registry
+COMMENT_GENERATION_PROMPT = """{profile}
+
+TASK:
+Write a single, authentic Reddit comment from this persona responding to the post above.
 
 Return ONLY the comment text, no quotes, no labels, no explanation."""
 
+BATCH_COMMENT_PROMPT = """PERSONAS (one comment each, keyed by id):
+{personas}
+
+TASK:
+For EACH persona above, write a single, authentic Reddit comment responding to the post above.
+
+Return ONLY a JSON array with exactly one object per persona id:
+[{{"id": 0, "comment": "..."}}, {{"id": 1, "comment": "..."}}]
+No markdown, no backticks, no explanation."""
+
+def _post_fields(post_data: dict) -> dict:
+    return {
+        "subreddit": post_data.get("subreddit", ""),
+        "post_type": post_data.get("post_type", ""),
+        "title": post_data.get("title", ""),
+        "body": post_data.get("body", ""),
+    }
+
+
+def _request(post_data: dict, task: str, max_tokens: int) -> dict:
+    """create_message kwargs: cached system prompt and post context, then the varying task."""
+    post_context = POST_CONTEXT.format(**_post_fields(post_data))
+    return {
+        "model": COMMENT_MODEL,
+        "max_tokens": max_tokens,
+        "system": [cached_block(COMMENT_SYSTEM_PROMPT)],
+        "messages": [{
+            "role": "user",
+            "content": [cached_block(post_context), {"type": "text", "text": task}],
+        }],
+    }
+
+
+def _single_request(post_data: dict, persona: Persona) -> dict:
+    return _request(post_data, COMMENT_GENERATION_PROMPT.format(profile=persona.profile), 300)
+
+
+def _batch_request(post_data: dict, slots: list[tuple[int, Persona]]) -> dict:
+    """create_message kwargs for one multi-persona request; slots are (id, persona)."""
+    personas = "\n\n".join(f"[id {slot}] {p.block}" for slot, p in slots)
+    return _request(post_data, BATCH_COMMENT_PROMPT.format(personas=personas), 300 * len(slots) + 100)
+
+
+def _parse_comment_batch(raw: str, ids: list[int]) -> dict[int, str]:
+    """Comments by slot id from a batch response; invalid or missing entries are left out."""
+    start, end = raw.find("["), raw.rfind("]")
+    if start == -1 or end <= start:
+        return {}
+    try:
+        items = json.loads(raw[start:end + 1])
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(items, list):
+        return {}
+
+    wanted = set(ids)
+    comments = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        slot, text = item.get("id"), item.get("comment")
+        if isinstance(slot, str) and slot.isdigit():
+            slot = int(slot)
+        if slot not in wanted or slot in comments or not isinstance(text, str):
+            continue
+        text = text.strip()
+        # Reject empty / placeholder / runaway outputs so the persona gets re-requested
+        if len(text.split()) < 3 or len(text) > 3000:
+            continue
+        comments[slot] = text
+    return comments
+
+
+def _score_for(persona: Persona) -> int:
+    # Generate realistic upvote score based on persona sentiment
+    # Positive personas tend to get more upvotes
+    base_score = random.randint(1, 50)
+    if persona.sentiment_class == "positive":
+        return base_score + random.randint(0, 100)
+    if persona.sentiment_class == "negative":
+        return max(1, base_score - random.randint(0, 30))
+    return base_score
+
+
+def _comment_record(persona: Persona, comment_text: str) -> dict:
+    return {
+        "author": persona.author,
+        "body": comment_text,
+        "score": _score_for(persona),
+        "persona_id": persona.id,
+        "persona_name": persona.name
+    }
+
 
-def generate_persona_comment(post_data: dict, persona: dict, api_key: str = "") -> str:
+def generate_persona_comment(post_data: dict, persona: Persona, api_key: str = "") -> str:
     """
     Generate a comment from a specific persona for a post (synchronous version).
     """
-    prompt = COMMENT_GENERATION_PROMPT.format(
-        subreddit=post_data.get("subreddit", ""),
-        post_type=post_data.get("post_type", ""),
-        title=post_data.get("title", ""),
-        body=post_data.get("body", ""),
-        persona_name=persona["name"],
-        age=persona["age"],
-        gender=persona["gender"],
-        occupation=persona["occupation"],
-        wealth=persona["wealth"],
-        attitude=persona["attitude_towards_products"],
-        communication_style=persona["communication_style"],
-        typical_sentiment=persona["typical_sentiment"],
-        interests=", ".join(persona["interests"]),
-        reddit_behavior=persona["reddit_behavior"]
-    )
-
-    _client = Anthropic(api_key=api_key or os.getenv("ANTHROPIC_API_KEY"))
-    response = _client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=300,
-        messages=[{"role": "user", "content": prompt}]
-    )
+    response = create_message_sync(api_key, lane=LANE_BACKGROUND, **_single_request(post_data, persona))
 
     return response.content[0].text.strip()
 
 
-async def generate_persona_comment_async(post_data: dict, persona: dict, api_key: str = "") -> str:
+async def generate_persona_comment_async(post_data: dict, persona: Persona, api_key: str = "") -> str:
     """
     Generate a comment from a specific persona for a post (async version).
     """
-    prompt = COMMENT_GENERATION_PROMPT.format(
-        subreddit=post_data.get("subreddit", ""),
-        post_type=post_data.get("post_type", ""),
-        title=post_data.get("title", ""),
-        body=post_data.get("body", ""),
-        persona_name=persona["name"],
-        age=persona["age"],
-        gender=persona["gender"],
-        occupation=persona["occupation"],
-        wealth=persona["wealth"],
-        attitude=persona["attitude_towards_products"],
-        communication_style=persona["communication_style"],
-        typical_sentiment=persona["typical_sentiment"],
-        interests=", ".join(persona["interests"]),
-        reddit_behavior=persona["reddit_behavior"]
-    )
-
-    _async_client = AsyncAnthropic(api_key=api_key or os.getenv("ANTHROPIC_API_KEY"))
-    response = await _async_client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=300,
-        messages=[{"role": "user", "content": prompt}]
-    )
+    response = await create_message(api_key, lane=LANE_BACKGROUND, **_single_request(post_data, persona))
 
     return response.content[0].text.strip()
 
 
-def generate_comments_for_post(post_data: dict, num_comments: int = None) -> list[dict]:
+def _generate_batched_sync(post_data: dict, personas: list[Persona], api_key: str = "") -> list[dict]:
+    slots = list(enumerate(personas))
+    texts: dict[int, str] = {}
+    chunks = [slots[i:i + COMMENT_BATCH_SIZE] for i in range(0, len(slots), COMMENT_BATCH_SIZE)]
+    for attempt in range(BATCH_RETRIES + 1):
+        for chunk in chunks:
+            try:
+                response = create_message_sync(api_key, lane=LANE_BACKGROUND, **_batch_request(post_data, chunk))
+                texts.update(_parse_comment_batch(response.content[0].text, [slot for slot, _ in chunk]))
+            except Exception as e:
+                print(f"[persona_comments] Batch of {len(chunk)} failed: {e}")
+        missing = [(slot, p) for slot, p in slots if slot not in texts]
+        if not missing:
+            break
+        print(f"[persona_comments] {len(missing)}/{len(slots)} personas invalid in batch (attempt {attempt + 1})")
+        chunks = [missing[i:i + COMMENT_BATCH_SIZE] for i in range(0, len(missing), COMMENT_BATCH_SIZE)]
+
+    for slot, persona in slots:
+        if slot in texts:
+            continue
+        try:
+            texts[slot] = generate_persona_comment(post_data, persona, api_key=api_key)
+        except Exception as e:
+            print(f"Error generating comment for persona {persona.name}: {e}")
+
+    return [_comment_record(p, texts[slot]) for slot, p in slots if slot in texts]
+
+
+async def _generate_batched_async(post_data: dict, personas: list[Persona], api_key: str = "") -> list[dict]:
+    slots = list(enumerate(personas))
+    texts: dict[int, str] = {}
+
+    async def run_chunk(chunk):
+        try:
+            response = await create_message(api_key, lane=LANE_BACKGROUND, **_batch_request(post_data, chunk))
+            return _parse_comment_batch(response.content[0].text, [slot for slot, _ in chunk])
+        except Exception as e:
+            print(f"[persona_comments] Batch of {len(chunk)} failed: {e}")
+            return {}
+
+    pending = slots
+    for attempt in range(BATCH_RETRIES + 1):
+        chunks = [pending[i:i + COMMENT_BATCH_SIZE] for i in range(0, len(pending), COMMENT_BATCH_SIZE)]
+        for result in await asyncio.gather(*[run_chunk(c) for c in chunks]):
+            texts.update(result)
+        pending = [(slot, p) for slot, p in slots if slot not in texts]
+        if not pending:
+            break
+        print(f"[persona_comments] {len(pending)}/{len(slots)} personas invalid in batch (attempt {attempt + 1})")
+
+    async def run_single(slot, persona):
+        try:
+            texts[slot] = await generate_persona_comment_async(post_data, persona, api_key=api_key)
+        except Exception as e:
+            print(f"Error generating comment for persona {persona.name}: {e}")
+
+    await asyncio.gather(*[run_single(slot, p) for slot, p in pending])
+
+    return [_comment_record(p, texts[slot]) for slot, p in slots if slot in texts]
+
+
+def generate_comments_for_post(post_data: dict, num_comments: int = None, api_key: str = "") -> list[dict]:
     """
     Generate between 2-15 comments for a post using random personas (synchronous version).
     Returns list of comment objects with author, body, score, and persona_id.
@@ -117,33 +233,19 @@ def generate_comments_for_post(post_data: dict, num_comments: int = None) -> lis
     if num_comments is None:
         num_comments = random.randint(2, 15)
 
-    # Randomly select personas (can repeat)
-    selected_personas = random.choices(PERSONAS, k=num_comments)
+    # Weighted random personas (can repeat), from the subreddit's segment if it has one
+    selected_personas = get_registry().sample(num_comments, segment=post_data.get("subreddit"))
+
+    if COMMENT_BATCHING:
+        return _generate_batched_sync(post_data, selected_personas, api_key=api_key)
 
     comments = []
     for persona in selected_personas:
         try:
-            comment_text = generate_persona_comment(post_data, persona)
-
-            # Generate realistic upvote score based on persona sentiment
-            # Positive personas tend to get more upvotes
-            base_score = random.randint(1, 50)
-            if "positive" in persona["typical_sentiment"]:
-                score = base_score + random.randint(0, 100)
-            elif "negative" in persona["typical_sentiment"]:
-                score = max(1, base_score - random.randint(0, 30))
-            else:
-                score = base_score
-
-            comments.append({
-                "author": persona["name"].replace(" ", "_").lower(),
-                "body": comment_text,
-                "score": score,
-                "persona_id": persona["id"],
-                "persona_name": persona["name"]
-            })
+            comment_text = generate_persona_comment(post_data, persona, api_key=api_key)
+            comments.append(_comment_record(persona, comment_text))
         except Exception as e:
-            print(f"Error generating comment for persona {persona['name']}: {e}")
+            print(f"Error generating comment for persona {persona.name}: {e}")
             continue
 
     return comments
@@ -153,37 +255,24 @@ async def generate_comments_for_post_async(post_data: dict, num_comments: int =
     """
     Generate between 2-15 comments for a post using random personas (async version).
     Returns list of comment objects with author, body, score, and persona_id.
-    Uses parallel API calls for faster generation.
+    Batched: usually a single request for the whole post.
     """
     if num_comments is None:
         num_comments = random.randint(2, 15)
 
-    # Randomly select personas (can repeat)
-    selected_personas = random.choices(PERSONAS, k=num_comments)
+    # Weighted random personas (can repeat), from the subreddit's segment if it has one
+    selected_personas = get_registry().sample(num_comments, segment=post_data.get("subreddit"))
+
+    if COMMENT_BATCHING:
+        return await _generate_batched_async(post_data, selected_personas, api_key=api_key)
 
     # Generate all comments in parallel
     async def generate_single_comment(persona):
         try:
             comment_text = await generate_persona_comment_async(post_data, persona, api_key=api_key)
-
-            # Generate realistic upvote score based on persona sentiment
-            base_score = random.randint(1, 50)
-            if "positive" in persona["typical_sentiment"]:
-                score = base_score + random.randint(0, 100)
-            elif "negative" in persona["typical_sentiment"]:
-                score = max(1, base_score - random.randint(0, 30))
-            else:
-                score = base_score
-
-            return {
-                "author": persona["name"].replace(" ", "_").lower(),
-                "body": comment_text,
-                "score": score,
-                "persona_id": persona["id"],
-                "persona_name": persona["name"]
-            }
+            return _comment_record(persona, comment_text)
         except Exception as e:
-            print(f"Error generating comment for persona {persona['name']}: {e}")
+            print(f"Error generating comment for persona {persona.name}: {e}")
             return None
 
     # Run all comment generations in parallel
@@ -0,0 +1,196 @@
+"""
+Persona registry
+
+personas.json compiled once into compact records: every prompt fragment a
+persona contributes is rendered at load time, its typical sentiment is
+parsed into a class, and weighted sampling uses Walker/Vose alias tables, so
+picking k personas and assembling their prompt parts is O(k) regardless of
+library size.
+
+Optional per-persona fields:
+  - "weight": relative sampling weight (default 1.0);
+  - "segments": audience / subreddit tags the persona belongs to (none by
+    default). Sampling for a segment draws up to one pick per member from
+    the segment and the rest from the whole library, so a post always gets a
+    mix of voices; without segment members it is a plain weighted draw.
+
+The file is re-read when its mtime changes (checked at most every
+PERSONA_RELOAD_INTERVAL seconds); a broken edit keeps the previous registry.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from pathlib import Path
+
+PERSONAS_PATH = Path(os.getenv("PERSONAS_PATH", str(Path(__file__).parent.parent / "personas.json")))
+RELOAD_INTERVAL = float(os.getenv("PERSONA_RELOAD_INTERVAL", "2"))
+
+PROFILE_TEMPLATE = """PERSONA PROFILE:
+Name: {name}
+Age: {age}, Gender: {gender}
+Occupation: {occupation}
+Wealth Level: {wealth}
+Attitude: {attitude}
+Communication Style: {communication_style}
+Typical Sentiment: {typical_sentiment}
+Interests: {interests}
+Reddit Behavior: {reddit_behavior}"""
+
+# Batch prompts prefix this with "[id N] "
+BLOCK_TEMPLATE = """{name} - Age: {age}, Gender: {gender}, Occupation: {occupation}, Wealth Level: {wealth}
+  Attitude: {attitude}
+  Communication Style: {communication_style}
+  Typical Sentiment: {typical_sentiment}
+  Interests: {interests}
+  Reddit Behavior: {reddit_behavior}"""
+
+
+def _sentiment_class(typical_sentiment: str) -> str:
+    text = typical_sentiment.lower()
+    if "positive" in text:
+        return "positive"
+    if "negative" in text:
+        return "negative"
+    return "neutral"
+
+
+def _segment_key(tag: str) -> str:
+    return tag.strip().lower().removeprefix("r/")
+
+
+class Persona:
+    __slots__ = ("id", "name", "author", "sentiment_class", "weight", "segments", "profile", "block")
+
+    def __init__(self, raw: dict):
+        fields = {
+            "name": raw["name"],
+            "age": raw["age"],
+            "gender": raw["gender"],
+            "occupation": raw["occupation"],
+            "wealth": raw["wealth"],
+            "attitude": raw["attitude_towards_products"],
+            "communication_style": raw["communication_style"],
+            "typical_sentiment": raw["typical_sentiment"],
+            "interests": ", ".join(raw["interests"]),
+            "reddit_behavior": raw["reddit_behavior"],
+        }
+        self.id = raw["id"]
+        self.name = raw["name"]
+        self.author = raw["name"].replace(" ", "_").lower()
+        self.sentiment_class = _sentiment_class(raw["typical_sentiment"])
+        self.weight = float(raw.get("weight", 1.0))
+        self.segments = tuple(_segment_key(t) for t in raw.get("segments", []))
+        self.profile = PROFILE_TEMPLATE.format(**fields)
+        self.block = BLOCK_TEMPLATE.format(**fields)
+
+
+class AliasSampler:
+    """O(1) weighted sampling with replacement (Vose's alias method)."""
+
+    __slots__ = ("items", "prob", "alias")
+
+    def __init__(self, items: list, weights: list[float]):
+        n = len(items)
+        total = sum(weights)
+        if n == 0 or total <= 0:
+            raise ValueError("AliasSampler needs at least one positive weight")
+        scaled = [w * n / total for w in weights]
+        self.items = items
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Leftovers are 1.0 up to rounding
+
+    def sample(self, k: int, rng: random.Random = random) -> list:
+        n = len(self.items)
+        out = []
+        for _ in range(k):
+            i = int(rng.random() * n)
+            out.append(self.items[i] if rng.random() < self.prob[i] else self.items[self.alias[i]])
+        return out
+
+
+class PersonaRegistry:
+    def __init__(self, raw_personas: list[dict]):
+        self.personas = [Persona(raw) for raw in raw_personas]
+        weighted = [p for p in self.personas if p.weight > 0]
+        self.by_id = {p.id: p for p in self.personas}
+        self._all = AliasSampler(weighted, [p.weight for p in weighted])
+        members: dict[str, list[Persona]] = {}
+        for p in weighted:
+            for segment in p.segments:
+                members.setdefault(segment, []).append(p)
+        self._segments = {
+            segment: AliasSampler(group, [p.weight for p in group]) for segment, group in members.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.personas)
+
+    def sample(self, k: int, segment: str | None = None) -> list[Persona]:
+        """k personas (with repetition) by weight, favouring `segment`'s members.
+
+        A segment with m members supplies min(k, m) picks; the rest come from
+        the whole library, so a small segment can't make one persona write
+        every comment.
+        """
+        sampler = self._segments.get(_segment_key(segment)) if segment else None
+        if sampler is None:
+            return self._all.sample(k)
+        from_segment = min(k, len(sampler.items))
+        picks = sampler.sample(from_segment) + self._all.sample(k - from_segment)
+        random.shuffle(picks)
+        return picks
+
+
+_registry: PersonaRegistry | None = None
+_mtime = 0.0
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def _load() -> PersonaRegistry:
+    with open(PERSONAS_PATH, "r") as f:
+        return PersonaRegistry(json.load(f)["personas"])
+
+
+def get_registry() -> PersonaRegistry:
+    """Current registry, reloaded if personas.json changed since the last check."""
+    global _registry, _mtime, _checked_at
+    now = time.monotonic()
+    if _registry is not None and now - _checked_at < RELOAD_INTERVAL:
+        return _registry
+    with _lock:
+        if _registry is not None and now - _checked_at < RELOAD_INTERVAL:
+            return _registry
+        _checked_at = now
+        try:
+            mtime = PERSONAS_PATH.stat().st_mtime
+        except OSError as e:
+            if _registry is None:
+                raise
+            print(f"[personas] Can't stat {PERSONAS_PATH}, keeping loaded personas: {e}")
+            return _registry
+        if _registry is None or mtime != _mtime:
+            try:
+                registry = _load()
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                if _registry is None:
+                    raise
+                print(f"[personas] Reload of {PERSONAS_PATH} failed, keeping previous personas: {e}")
+                _mtime = mtime  # don't retry (and re-log) until the file changes again
+            else:
+                if _registry is not None:
+                    print(f"[personas] Reloaded {len(registry)} personas")
+                _registry, _mtime = registry, mtime
+        return _registry
@@ -6,43 +6,41 @@ each community's rules, tone, recent discussions, and culture — then
 crafting posts that feel like they belong.
 """
 
-import os
+import asyncio
+import hashlib
 import json
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from anthropic import Anthropic
+import os
+import re
+import time
+from services.llm_scheduler import (
+    LANE_INTERACTIVE, PrioritySlots, cached_block, create_message, create_message_sync, stream_message,
+)
+from services.ttl_cache import TTLCache
 from dotenv import load_dotenv
 
 load_dotenv()
 
+POST_MODEL = "claude-haiku-4-5-20251001"
 
-def generate_posts_for_subreddit(product: dict, subreddit: dict, api_key: str = "") -> list[dict]:
-    """
-    Generate 3 subreddit-native post drafts for a single subreddit.
+# Process-wide cap on subreddits being generated at once, shared by every
+# request (the LLM scheduler additionally caps requests per model)
+POST_GEN_CONCURRENCY = int(os.getenv("POST_GEN_CONCURRENCY", "8"))
+_slots = PrioritySlots(POST_GEN_CONCURRENCY)
 
-    Each draft is deeply tailored to the subreddit's rules, tone, recent
-    discussions, and community culture — not generic templates.
-    """
-    sub_name = subreddit.get("subreddit", "")
-    description = subreddit.get("description", "N/A")
-    subscribers = subreddit.get("subscribers", 0)
-    active_users = subreddit.get("active_users", 0)
-    rules = subreddit.get("rules", [])
-    recent_posts = subreddit.get("recent_posts", [])
+# Minimum seconds between partial-draft updates per subreddit when streaming
+DELTA_INTERVAL = 0.15
 
-    # Build rich context about recent posts
-    posts_analysis = []
-    for p in recent_posts:
-        title = p.get("title", "")
-        upvotes = p.get("upvotes", 0)
-        comments = p.get("num_comments", 0)
-        posts_analysis.append(
-            f'  - "{title}" ({upvotes} upvotes, {comments} comments)'
-        )
-    posts_text = "\n".join(posts_analysis) if posts_analysis else "  No recent posts available."
-
-    rules_text = "\n".join(f"  {i+1}. {r}" for i, r in enumerate(rules)) if rules else "  No specific rules found."
+# Validated drafts, content-addressed by everything that goes into the prompt
+# (see _draft_fingerprint), so pressing generate again on the same product and
+# subreddits is a cache hit. Fallback drafts are never cached.
+_draft_cache = TTLCache(
+    maxsize=int(os.getenv("DRAFT_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("DRAFT_CACHE_TTL", str(24 * 3600))),
+    db_path=os.getenv("SCRAPE_CACHE_PATH") or None,
+    namespace="drafts",
+)
 
-    system_prompt = """You are an expert Reddit community analyst and growth marketer. Your job is to write posts that are INDISTINGUISHABLE from native community content.
+SYSTEM_PROMPT = """You are an expert Reddit community analyst and growth marketer. Your job is to write posts that are INDISTINGUISHABLE from native community content.
 
 CRITICAL RULES:
 1. STUDY the recent hot posts below. Match their EXACT writing style — sentence length, vocabulary, formatting, level of formality, use of paragraphs vs bullet points.
@@ -110,14 +108,39 @@ CONFIDENCE SCORING GUIDE:
 - 0.3-0.49: Risky, subreddit is hostile to this type of content
 - 0.0-0.29: Very unlikely to be well-received, rules essentially prohibit it"""
 
-    user_prompt = f"""PRODUCT INFORMATION:
+
+def _product_block(product: dict) -> str:
+    return f"""PRODUCT INFORMATION:
 - Product Name: {product.get("product_name", "")}
 - What It Does: {product.get("product_description", "")}
 - Niche/Category: {product.get("niche_category", "")}
 - Target Audience: {product.get("target_audience", "")}
-- Keywords: {", ".join(product.get("keywords", []))}
+- Keywords: {", ".join(product.get("keywords", []))}"""
+
+
+def _build_request(product: dict, subreddit: dict) -> dict:
+    """create_message kwargs for one subreddit's drafts."""
+    sub_name = subreddit.get("subreddit", "")
+    description = subreddit.get("description", "N/A")
+    subscribers = subreddit.get("subscribers", 0)
+    active_users = subreddit.get("active_users", 0)
+    rules = subreddit.get("rules", [])
+    recent_posts = subreddit.get("recent_posts", [])
+
+    # Build rich context about recent posts
+    posts_analysis = []
+    for p in recent_posts:
+        title = p.get("title", "")
+        upvotes = p.get("upvotes", 0)
+        comments = p.get("num_comments", 0)
+        posts_analysis.append(
+            f'  - "{title}" ({upvotes} upvotes, {comments} comments)'
+        )
+    posts_text = "\n".join(posts_analysis) if posts_analysis else "  No recent posts available."
+
+    rules_text = "\n".join(f"  {i+1}. {r}" for i, r in enumerate(rules)) if rules else "  No specific rules found."
 
-TARGET SUBREDDIT: r/{sub_name}
+    user_prompt = f"""TARGET SUBREDDIT: r/{sub_name}
 - Community Description: {description}
 - Size: {subscribers:,} subscribers, {active_users:,} currently active
 - Self-Promo Tolerance Score: {subreddit.get("breakdown", {}).get("tolerance", "unknown")}
@@ -136,49 +159,190 @@ ANALYSIS INSTRUCTIONS:
 
 Generate the 3 tailored posts for r/{sub_name}. Return ONLY the JSON array."""
 
-    try:
-        _client = Anthropic(api_key=api_key or os.getenv("ANTHROPIC_API_KEY"))
-        response = _client.messages.create(
-            model="claude-haiku-4-5-20251001",
-            max_tokens=4000,
-            system=system_prompt,
-            messages=[{"role": "user", "content": user_prompt}],
-        )
+    return {
+        "model": POST_MODEL,
+        "max_tokens": 4000,
+        # Static instructions, then the product block shared by every
+        # subreddit of this run: both cacheable, subreddit context last
+        "system": [cached_block(SYSTEM_PROMPT), cached_block(_product_block(product))],
+        "messages": [{"role": "user", "content": user_prompt}],
+    }
+
+
+def _normalize(text) -> str:
+    return " ".join(str(text or "").split())
+
+
+def _draft_fingerprint(product: dict, subreddit: dict) -> str:
+    """Hash of the normalized prompt inputs, the model and the prompt itself."""
+    payload = {
+        "model": POST_MODEL,
+        "prompt": hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest(),
+        "product": {
+            "name": _normalize(product.get("product_name")),
+            "description": _normalize(product.get("product_description")),
+            "niche": _normalize(product.get("niche_category")),
+            "audience": _normalize(product.get("target_audience")),
+            "keywords": sorted({_normalize(k).lower() for k in product.get("keywords", []) if _normalize(k)}),
+        },
+        "subreddit": {
+            "name": _normalize(subreddit.get("subreddit")).lower(),
+            "description": _normalize(subreddit.get("description")),
+            "tolerance": subreddit.get("breakdown", {}).get("tolerance"),
+            "rules": [_normalize(r) for r in subreddit.get("rules", [])],
+            "titles": [_normalize(p.get("title")) for p in subreddit.get("recent_posts", [])],
+        },
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def cache_stats() -> dict:
+    return {"drafts": _draft_cache.stats()}
 
-        text = response.content[0].text.strip()
-
-        # Strip markdown fences if present
-        if text.startswith("```"):
-            lines = text.split("\n", 1)
-            text = lines[1] if len(lines) > 1 else text[3:]
-        if text.endswith("```"):
-            text = text[:-3]
-        text = text.strip()
-
-        drafts = json.loads(text)
-
-        # Validate and clean
-        valid_types = {"question_post", "discussion_post", "resource_share"}
-        validated = []
-        for d in drafts:
-            if isinstance(d, dict) and d.get("type") in valid_types:
-                validated.append({
-                    "type": d["type"],
-                    "label": d.get("label", d["type"].replace("_", " ").title()),
-                    "title": d.get("title", ""),
-                    "body": d.get("body", ""),
-                    "strategy": d.get("strategy", ""),
-                    "confidence_score": round(float(d.get("confidence_score", 0.5)), 2),
-                    "recommended_cadence": d.get("recommended_cadence", ""),
-                })
-
-        if len(validated) == 3:
-            return validated
-        return _fallback_drafts(product, subreddit)
 
+VALID_TYPES = {"question_post", "discussion_post", "resource_share"}
+
+
+def _clean_draft(d) -> dict | None:
+    if not isinstance(d, dict) or d.get("type") not in VALID_TYPES:
+        return None
+    return {
+        "type": d["type"],
+        "label": d.get("label", d["type"].replace("_", " ").title()),
+        "title": d.get("title", ""),
+        "body": d.get("body", ""),
+        "strategy": d.get("strategy", ""),
+        "confidence_score": round(float(d.get("confidence_score", 0.5)), 2),
+        "recommended_cadence": d.get("recommended_cadence", ""),
+    }
+
+
+class DraftStreamParser:
+    """Incremental parser for the streamed JSON array of drafts.
+
+    feed() takes raw text deltas and returns the draft objects completed by
+    them; partial() best-effort decodes the string fields of the object
+    still being written, so its title/body can be shown as they arrive.
+    """
+
+    def __init__(self):
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        self._current: list[str] | None = None
+
+    def feed(self, delta: str) -> list[dict]:
+        completed = []
+        for ch in delta:
+            if not self._started:
+                self._started = ch == "["
+                continue
+            if self._current is not None:
+                self._current.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                if self._depth == 0:
+                    self._current = [ch]
+                self._depth += 1
+            elif ch == "}" and self._depth:
+                self._depth -= 1
+                if self._depth == 0 and self._current is not None:
+                    try:
+                        completed.append(json.loads("".join(self._current)))
+                    except json.JSONDecodeError:
+                        pass
+                    self._current = None
+        return completed
+
+    def partial(self) -> dict:
+        """String fields of the in-progress object, including a value cut off mid-way."""
+        if self._current is None:
+            return {}
+        raw = "".join(self._current)
+        fields = {}
+        for match in re.finditer(r'"(type|title|body)"\s*:\s*"((?:[^"\\]|\\.)*)("?)', raw):
+            value = match.group(2)
+            if not match.group(3):
+                value = re.sub(r"\\(u[0-9a-fA-F]{0,3})?$", "", value)  # drop a dangling escape
+            try:
+                fields[match.group(1)] = json.loads(f'"{value}"')
+            except json.JSONDecodeError:
+                fields[match.group(1)] = value
+        return fields
+
+
+def _parse_drafts(text: str) -> list[dict] | None:
+    """The 3 validated drafts from a model response, or None if it doesn't hold exactly 3."""
+    text = text.strip()
+
+    # Strip markdown fences if present
+    if text.startswith("```"):
+        lines = text.split("\n", 1)
+        text = lines[1] if len(lines) > 1 else text[3:]
+    if text.endswith("```"):
+        text = text[:-3]
+    text = text.strip()
+
+    drafts = json.loads(text)
+
+    # Validate and clean
+    validated = [clean for clean in map(_clean_draft, drafts) if clean]
+    return validated if len(validated) == 3 else None
+
+
+def generate_posts_for_subreddit(product: dict, subreddit: dict, api_key: str = "", regenerate: bool = False) -> list[dict]:
+    """
+    Generate 3 subreddit-native post drafts for a single subreddit.
+
+    Each draft is deeply tailored to the subreddit's rules, tone, recent
+    discussions, and community culture — not generic templates.
+    Cached by prompt fingerprint; regenerate=True skips the lookup (the
+    fresh drafts replace the cached ones).
+    """
+    key = _draft_fingerprint(product, subreddit)
+    cached = None if regenerate else _draft_cache.get(key)
+    if cached is not None:
+        return cached
+    try:
+        response = create_message_sync(api_key, **_build_request(product, subreddit))
+        drafts = _parse_drafts(response.content[0].text)
+    except Exception as e:
+        print(f"[post_generator] Error generating for r/{subreddit.get('subreddit', '')}: {e}")
+        drafts = None
+    if drafts is None:
+        return _fallback_drafts(product, subreddit)
+    _draft_cache.set(key, drafts)
+    return drafts
+
+
+async def generate_posts_for_subreddit_async(
+    product: dict, subreddit: dict, api_key: str = "", regenerate: bool = False
+) -> list[dict]:
+    """Async generate_posts_for_subreddit(); never raises, falls back to template drafts."""
+    key = _draft_fingerprint(product, subreddit)
+    cached = None if regenerate else await _draft_cache.aget(key)
+    if cached is not None:
+        return cached
+    try:
+        response = await create_message(api_key, **_build_request(product, subreddit))
+        drafts = _parse_drafts(response.content[0].text)
     except Exception as e:
-        print(f"[post_generator] Error generating for r/{sub_name}: {e}")
+        print(f"[post_generator] Error generating for r/{subreddit.get('subreddit', '')}: {e}")
+        drafts = None
+    if drafts is None:
         return _fallback_drafts(product, subreddit)
+    _draft_cache.set(key, drafts)
+    return drafts
 
 
 def _fallback_drafts(product: dict, subreddit: dict) -> list[dict]:
@@ -217,22 +381,116 @@ def _fallback_drafts(product: dict, subreddit: dict) -> list[dict]:
     ]
 
 
-def generate_all_posts(product: dict, subreddits: list[dict], api_key: str = "") -> list[dict]:
+async def stream_posts_for_subreddit(product: dict, subreddit: dict, api_key: str = "", regenerate: bool = False):
     """
-    Generate post drafts for all subreddits in parallel.
-    All Claude calls fire concurrently via ThreadPoolExecutor.
+    Streaming generate_posts_for_subreddit(). Yields events as the model writes:
+      ("delta", draft_index, partial_fields)  text of the draft being written (throttled)
+      ("draft", draft_index, draft)           a draft that just validated
+      ("done", None, drafts)                  the final 3 drafts (fallback ones on failure)
+    A cache hit yields its drafts and "done" straight away.
     """
-    results = [None] * len(subreddits)
+    key = _draft_fingerprint(product, subreddit)
+    cached = None if regenerate else await _draft_cache.aget(key)
+    if cached is not None:
+        for i, draft in enumerate(cached):
+            yield "draft", i, draft
+        yield "done", None, cached
+        return
+
+    parser = DraftStreamParser()
+    drafts: list[dict] = []
+    last_delta = 0.0
+    try:
+        async for delta in stream_message(api_key, **_build_request(product, subreddit)):
+            for obj in parser.feed(delta):
+                draft = _clean_draft(obj)
+                if draft:
+                    drafts.append(draft)
+                    yield "draft", len(drafts) - 1, draft
+            now = time.monotonic()
+            if now - last_delta >= DELTA_INTERVAL:
+                partial = parser.partial()
+                if partial:
+                    last_delta = now
+                    yield "delta", len(drafts), partial
+    except Exception as e:
+        print(f"[post_generator] Error streaming for r/{subreddit.get('subreddit', '')}: {e}")
+        drafts = []
+    if len(drafts) == 3:
+        _draft_cache.set(key, drafts)
+        yield "done", None, drafts
+    else:
+        yield "done", None, _fallback_drafts(product, subreddit)
+
+
+async def iter_generated_posts_stream(
+    product: dict, subreddits: list[dict], api_key: str = "", regenerate: bool = False
+):
+    """
+    Merge the per-subreddit streams: yields (index, kind, draft_index, payload)
+    in arrival order, under the same process-wide bound as iter_generated_posts().
+    """
+    queue: asyncio.Queue = asyncio.Queue()
 
-    def _generate(index: int, sub: dict):
-        print(f"[post_generator] Generating posts for r/{sub.get('subreddit', '?')}...")
-        drafts = generate_posts_for_subreddit(product, sub, api_key=api_key)
+    async def _run(index: int, sub: dict):
+        await _slots.acquire(LANE_INTERACTIVE)
+        try:
+            async for kind, draft_index, payload in stream_posts_for_subreddit(product, sub, api_key=api_key, regenerate=regenerate):
+                await queue.put((index, kind, draft_index, payload))
+        finally:
+            _slots.release()
+
+    tasks = [asyncio.create_task(_run(i, sub)) for i, sub in enumerate(subreddits)]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            event = await queue.get()
+            if event[1] == "done":
+                remaining -= 1
+            yield event
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def iter_generated_posts(product: dict, subreddits: list[dict], api_key: str = "", regenerate: bool = False):
+    """
+    Yield (index, {"subreddit", "drafts"}) per subreddit as soon as it's done.
+
+    Generation runs as tasks on the event loop (no thread per subreddit);
+    at most POST_GEN_CONCURRENCY subreddits are in flight process-wide,
+    across all concurrent requests. One subreddit failing yields fallback
+    drafts for it without affecting the others. If the consumer stops
+    early, the remaining work is cancelled.
+    """
+    async def _generate(index: int, sub: dict):
+        await _slots.acquire(LANE_INTERACTIVE)
+        try:
+            print(f"[post_generator] Generating posts for r/{sub.get('subreddit', '?')}...")
+            drafts = await generate_posts_for_subreddit_async(product, sub, api_key=api_key, regenerate=regenerate)
+        finally:
+            _slots.release()
         return index, {"subreddit": sub.get("subreddit", ""), "drafts": drafts}
 
-    with ThreadPoolExecutor(max_workers=len(subreddits)) as executor:
-        futures = [executor.submit(_generate, i, sub) for i, sub in enumerate(subreddits)]
-        for future in as_completed(futures):
-            idx, result = future.result()
-            results[idx] = result
+    tasks = [asyncio.create_task(_generate(i, sub)) for i, sub in enumerate(subreddits)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
 
+async def generate_all_posts_async(
+    product: dict, subreddits: list[dict], api_key: str = "", regenerate: bool = False
+) -> list[dict]:
+    """Post drafts for all subreddits, in input order."""
+    results = [None] * len(subreddits)
+    async for index, result in iter_generated_posts(product, subreddits, api_key=api_key, regenerate=regenerate):
+        results[index] = result
     return results
+
+
+def generate_all_posts(product: dict, subreddits: list[dict], api_key: str = "", regenerate: bool = False) -> list[dict]:
+    """Synchronous wrapper for scripts; the API awaits generate_all_posts_async()."""
+    return asyncio.run(generate_all_posts_async(product, subreddits, api_key=api_key, regenerate=regenerate))
@@ -0,0 +1,82 @@
+"""
+Token-bucket rate limiting
+
+A small, loop-agnostic token bucket. State is guarded by a threading lock so
+a single bucket can be shared by coroutines running on different event loops
+(e.g. the uvicorn loop and a worker thread's asyncio.run) as well as plain
+threads.
+"""
+
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens/second, bursts up to `capacity`.
+
+    reserve() never blocks — it takes the tokens immediately (the balance may
+    go negative) and returns how long the caller has to wait before using
+    them, so concurrent callers queue up fairly behind each other.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = max(rate, 1e-6)
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        # _updated may sit in the future while the bucket is paused
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """Take `amount` tokens, return the delay (seconds) before they are usable."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= amount
+            delay = max(0.0, self._updated - now)
+            if self._tokens < 0:
+                delay += -self._tokens / self.rate
+            return delay
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        delay = self.reserve(amount)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def acquire_sync(self, amount: float = 1.0) -> None:
+        delay = self.reserve(amount)
+        if delay > 0:
+            time.sleep(delay)
+
+    def refund(self, amount: float) -> None:
+        """Give back tokens that were reserved but turned out not to be needed."""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+    def set_rate(self, rate: float, available: float | None = None, capacity: float | None = None) -> None:
+        """Re-tune the bucket from server feedback (e.g. rate-limit headers).
+
+        `available` is the server's own count of what is left and replaces the
+        local balance (including any debt from earlier reservations).
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(rate, 1e-6)
+            if capacity is not None:
+                self.capacity = max(capacity, 1.0)
+            if available is not None:
+                self._tokens = min(self.capacity, available)
+
+    def pause(self, seconds: float) -> None:
+        """Drain the bucket and stop refilling for `seconds` (server said back off)."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens = min(self._tokens, 0.0)
+            self._updated = max(self._updated, now + seconds)
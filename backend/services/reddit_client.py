@@ -0,0 +1,163 @@
+"""
+Async Reddit fetch engine
+
+Shared, pooled httpx client for Reddit's public JSON endpoints. Every request
+goes through one process-wide token bucket that is re-synced from Reddit's
+X-Ratelimit-* response headers: the balance and burst follow
+X-Ratelimit-Remaining, so requests only slow down when the window is nearly
+used up (and pause until the reset once it is). 429/5xx responses are
+retried with exponential backoff instead of sleeping a fixed amount after
+every call.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import weakref
+
+import httpx
+from dotenv import load_dotenv
+
+from services.rate_limit import TokenBucket
+
+load_dotenv()
+
+BASE_URL = "https://www.reddit.com"
+HEADERS = {"User-Agent": "LexTrackAI_Hackathon_Bot_v1.0 (by /u/lextrack_ai)"}
+
+REQUESTS_PER_SECOND = float(os.getenv("REDDIT_REQUESTS_PER_SECOND", "1.0"))
+BURST = float(os.getenv("REDDIT_BURST", "10"))
+MAX_CONCURRENCY = int(os.getenv("REDDIT_MAX_CONCURRENCY", "8"))
+MAX_RETRIES = int(os.getenv("REDDIT_MAX_RETRIES", "3"))
+TIMEOUT = 10.0
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Longest single wait before re-checking the bucket, so waiters pick up a
+# re-sync from headers that arrive while they sleep
+MAX_WAIT_STEP = 0.5
+
+# Until the first response, REQUESTS_PER_SECOND / BURST are a guess
+_bucket = TokenBucket(REQUESTS_PER_SECOND, BURST)
+# Requests sent but not yet answered: Reddit's Remaining doesn't count them yet.
+# Shared by every loop (sync wrappers run their own on worker threads).
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+# httpx.AsyncClient and asyncio.Semaphore are bound to the loop they are first
+# used on, so keep one pool per running loop.
+_loop_state: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple[httpx.AsyncClient, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+
+
+def _get_state() -> tuple[httpx.AsyncClient, asyncio.Semaphore]:
+    loop = asyncio.get_running_loop()
+    state = _loop_state.get(loop)
+    if state is None or state[0].is_closed:
+        client = httpx.AsyncClient(
+            base_url=BASE_URL,
+            headers=HEADERS,
+            timeout=TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=MAX_CONCURRENCY,
+                max_keepalive_connections=MAX_CONCURRENCY,
+            ),
+        )
+        state = (client, asyncio.Semaphore(MAX_CONCURRENCY))
+        _loop_state[loop] = state
+    return state
+
+
+async def aclose() -> None:
+    """Close the pooled client for the current loop (call on shutdown)."""
+    state = _loop_state.pop(asyncio.get_running_loop(), None)
+    if state is not None:
+        await state[0].aclose()
+
+
+def _header_float(resp: httpx.Response, name: str) -> float | None:
+    try:
+        return float(resp.headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+def _sync_rate_limit(resp: httpx.Response) -> None:
+    """Follow Reddit's X-Ratelimit-Remaining / X-Ratelimit-Reset headers."""
+    remaining = _header_float(resp, "x-ratelimit-remaining")
+    reset = _header_float(resp, "x-ratelimit-reset")
+    if remaining is None or reset is None:
+        return
+    if remaining < 1:
+        # Window used up: wait for the reset, then probe with one request
+        # whose headers re-sync the bucket to the new window
+        _bucket.pause(reset)
+        _bucket.set_rate(REQUESTS_PER_SECOND, available=1.0, capacity=BURST)
+    else:
+        with _in_flight_lock:
+            in_flight = _in_flight
+        _bucket.set_rate(
+            remaining / max(reset, 1.0), available=remaining - in_flight, capacity=max(remaining, 1.0)
+        )
+
+
+async def _acquire() -> None:
+    """Wait for a request token, re-checking the bucket rather than sleeping
+    out a delay computed before Reddit's headers re-synced it."""
+    while True:
+        delay = _bucket.reserve()
+        if delay <= 0:
+            return
+        _bucket.refund(1.0)
+        await asyncio.sleep(min(delay, MAX_WAIT_STEP))
+
+
+def _retry_delay(resp: httpx.Response | None, attempt: int) -> float:
+    if resp is not None:
+        retry_after = _header_float(resp, "retry-after")
+        if retry_after is None and resp.status_code == 429:
+            retry_after = _header_float(resp, "x-ratelimit-reset")
+        if retry_after is not None:
+            return retry_after
+    return 0.5 * (2 ** attempt) + random.uniform(0, 0.5)
+
+
+async def fetch_json(path: str, params: dict | None = None) -> dict | None:
+    """GET a Reddit JSON endpoint. Returns the parsed body, or None on failure."""
+    global _in_flight
+    client, semaphore = _get_state()
+    for attempt in range(MAX_RETRIES + 1):
+        resp = None
+        try:
+            async with semaphore:
+                await _acquire()
+                with _in_flight_lock:
+                    _in_flight += 1
+                try:
+                    resp = await client.get(path, params=params)
+                finally:
+                    with _in_flight_lock:
+                        _in_flight -= 1
+            _sync_rate_limit(resp)
+            if resp.status_code == 200:
+                try:
+                    return resp.json()
+                except ValueError as e:
+                    # e.g. an HTML interstitial or redirect page; retrying won't help
+                    print(f"[reddit_client] {path} returned a non-JSON body: {e}")
+                    return None
+            if resp.status_code not in RETRY_STATUSES:
+                return None
+            if resp.status_code == 429:
+                # Throttle every caller, not just this one; the retry then
+                # waits in _acquire()
+                _bucket.pause(_retry_delay(resp, attempt))
+                continue
+        except httpx.TransportError as e:
+            print(f"[reddit_client] {path} attempt {attempt + 1} failed: {e}")
+
+        if attempt < MAX_RETRIES:
+            await asyncio.sleep(_retry_delay(resp, attempt))
+
+    print(f"[reddit_client] Giving up on {path} after {MAX_RETRIES + 1} attempts")
+    return None
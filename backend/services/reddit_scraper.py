@@ -9,110 +9,159 @@ scores them with semantic similarity + tolerance + activity, returns ranked JSON
 import os
 import json
 import math
-import time
-import requests
+import asyncio
+import hashlib
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
-from anthropic import Anthropic
 from dotenv import load_dotenv
 
+from services import subreddit_catalog
+from services.reddit_client import fetch_json
+from services.ttl_cache import TTLCache
+from services.embedding_model import embed
+from services.worker_pool import run_blocking
+from services.llm_scheduler import cached_block, create_message
+
 load_dotenv()
 
-# Lazy-loaded globals
-_embed_model = None
+# ------------------------------------------------------------------
+# Scraping (public Reddit JSON endpoints, no API key needed)
+# All requests go through the shared, rate-limited client in
+# services.reddit_client; the sync wrappers are kept for scripts.
+# Results are cached per resource type: rules and descriptions barely
+# change, hot posts go stale within minutes.
+# ------------------------------------------------------------------
 
-HEADERS = {"User-Agent": "LexTrackAI_Hackathon_Bot_v1.0 (by /u/lextrack_ai)"}
+SCRAPE_TTLS = {
+    "about": float(os.getenv("SCRAPE_TTL_ABOUT", str(6 * 3600))),
+    "rules": float(os.getenv("SCRAPE_TTL_RULES", str(24 * 3600))),
+    "hot": float(os.getenv("SCRAPE_TTL_HOT", str(10 * 60))),
+}
+
+_scrape_cache = TTLCache(
+    maxsize=int(os.getenv("SCRAPE_CACHE_SIZE", "2048")),
+    db_path=os.getenv("SCRAPE_CACHE_PATH") or None,
+    namespace="reddit_scrape",
+)
+
+
+async def _cached(kind: str, key: str, fetch):
+    """Serve `kind` data from the scrape cache, falling back to fetch().
+    Failed fetches (None) are not cached so they are retried next time."""
+    cache_key = f"{kind}:{key.lower()}"
+    value = await _scrape_cache.aget(cache_key)
+    if value is None:
+        value = await fetch()
+        if value is not None:
+            _scrape_cache.set(cache_key, value, ttl=SCRAPE_TTLS[kind])
+    return value
+
+
+async def _fetch_rules(subreddit: str) -> list[str] | None:
+    data = await fetch_json(f"/r/{subreddit}/about/rules.json")
+    if data is None:
+        return None
+    rules = []
+    for rule in data.get("rules", []):
+        rules.append(rule.get("short_name", "") + ": " + rule.get("description", ""))
+    return rules
+
+
+async def _fetch_about(subreddit: str) -> dict | None:
+    data = await fetch_json(f"/r/{subreddit}/about.json")
+    if data is None:
+        return None
+    data = data.get("data", {})
+    return {
+        "display_name": data.get("display_name", subreddit),
+        "description": data.get("public_description", ""),
+        "subscribers": data.get("subscribers", 0),
+        "active_users": data.get("accounts_active", 0),
+        "over18": bool(data.get("over18", False)),
+    }
 
 
-def _get_embed_model():
-    global _embed_model
-    if _embed_model is None:
-        _embed_model = SentenceTransformer("all-MiniLM-L6-v2")
-    return _embed_model
+async def _fetch_posts(subreddit: str, limit: int) -> list[dict] | None:
+    data = await fetch_json(f"/r/{subreddit}/hot.json", params={"limit": limit})
+    if data is None:
+        return None
+    posts = []
+    for post in data.get("data", {}).get("children", []):
+        p = post.get("data", {})
+        if not p.get("stickied"):
+            posts.append({
+                "title": p.get("title", ""),
+                "upvotes": p.get("score", 0),
+                "num_comments": p.get("num_comments", 0),
+                "url": f"https://www.reddit.com{p.get('permalink', '')}",
+            })
+    return posts
 
 
-# ------------------------------------------------------------------
-# Scraping (public Reddit JSON endpoints, no API key needed)
-# ------------------------------------------------------------------
+async def scrape_subreddit_rules_async(subreddit: str) -> list[str]:
+    return await _cached("rules", subreddit, lambda: _fetch_rules(subreddit)) or []
+
+
+async def scrape_subreddit_about_async(subreddit: str) -> dict:
+    return await _cached("about", subreddit, lambda: _fetch_about(subreddit)) or {}
+
+
+async def scrape_subreddit_posts_async(subreddit: str, limit: int = 5) -> list[dict]:
+    return await _cached("hot", f"{subreddit}:{limit}", lambda: _fetch_posts(subreddit, limit)) or []
+
 
 def scrape_subreddit_rules(subreddit: str) -> list[str]:
-    url = f"https://www.reddit.com/r/{subreddit}/about/rules.json"
-    try:
-        resp = requests.get(url, headers=HEADERS, timeout=10)
-        if resp.status_code != 200:
-            return []
-        rules = []
-        for rule in resp.json().get("rules", []):
-            rules.append(rule.get("short_name", "") + ": " + rule.get("description", ""))
-        time.sleep(1.5)
-        return rules
-    except Exception as e:
-        print(f"[scraper] Error fetching rules for {subreddit}: {e}")
-        return []
+    return asyncio.run(scrape_subreddit_rules_async(subreddit))
 
 
 def scrape_subreddit_about(subreddit: str) -> dict:
-    url = f"https://www.reddit.com/r/{subreddit}/about.json"
-    try:
-        resp = requests.get(url, headers=HEADERS, timeout=10)
-        if resp.status_code != 200:
-            return {}
-        data = resp.json().get("data", {})
-        time.sleep(1.5)
-        return {
-            "description": data.get("public_description", ""),
-            "subscribers": data.get("subscribers", 0),
-            "active_users": data.get("accounts_active", 0),
-        }
-    except Exception as e:
-        print(f"[scraper] Error fetching about for {subreddit}: {e}")
-        return {}
+    return asyncio.run(scrape_subreddit_about_async(subreddit))
 
 
 def scrape_subreddit_posts(subreddit: str, limit: int = 5) -> list[dict]:
-    url = f"https://www.reddit.com/r/{subreddit}/hot.json?limit={limit}"
-    try:
-        resp = requests.get(url, headers=HEADERS, timeout=10)
-        if resp.status_code != 200:
-            return []
-        children = resp.json().get("data", {}).get("children", [])
-        posts = []
-        for post in children:
-            p = post.get("data", {})
-            if not p.get("stickied"):
-                posts.append({
-                    "title": p.get("title", ""),
-                    "upvotes": p.get("score", 0),
-                    "num_comments": p.get("num_comments", 0),
-                    "url": f"https://www.reddit.com{p.get('permalink', '')}",
-                })
-        time.sleep(1.5)
-        return posts
-    except Exception as e:
-        print(f"[scraper] Error fetching posts for {subreddit}: {e}")
-        return []
+    return asyncio.run(scrape_subreddit_posts_async(subreddit, limit))
 
 
-def gather_live_data(subreddit_names: list[str], on_progress=None) -> dict:
-    """Scrape all target subreddits, return structured data.
-    on_progress(phase, subreddit, index, total) is called after each subreddit.
+async def scrape_subreddit_async(subreddit: str) -> dict:
+    """Fetch about/rules/hot for one subreddit concurrently."""
+    print(f"[scraper] Scraping r/{subreddit}...")
+    about, rules, posts = await asyncio.gather(
+        scrape_subreddit_about_async(subreddit),
+        scrape_subreddit_rules_async(subreddit),
+        scrape_subreddit_posts_async(subreddit),
+    )
+    return {
+        "description": about.get("description", ""),
+        "subscribers": about.get("subscribers", 0),
+        "active_users": about.get("active_users", 0),
+        "over18": about.get("over18", False),
+        "rules": rules,
+        "recent_posts": posts,
+    }
+
+
+async def gather_live_data_async(subreddit_names: list[str], on_progress=None) -> dict:
+    """Scrape all target subreddits concurrently, return structured data.
+    on_progress(phase, subreddit, index, total) is called as each subreddit finishes.
     """
-    live_data = {}
     total = len(subreddit_names)
-    for i, sub in enumerate(subreddit_names):
-        print(f"[scraper] Scraping r/{sub}...")
+    done = 0
+
+    async def _scrape(sub: str):
+        nonlocal done
+        data = await scrape_subreddit_async(sub)
         if on_progress:
-            on_progress("scraping", sub, i, total)
-        about = scrape_subreddit_about(sub)
-        live_data[sub] = {
-            "description": about.get("description", ""),
-            "subscribers": about.get("subscribers", 0),
-            "active_users": about.get("active_users", 0),
-            "rules": scrape_subreddit_rules(sub),
-            "recent_posts": scrape_subreddit_posts(sub),
-        }
-    return live_data
+            on_progress("scraping", sub, done, total)
+        done += 1
+        return sub, data
+
+    results = await asyncio.gather(*[_scrape(sub) for sub in subreddit_names])
+    # Keep the caller's ordering regardless of completion order
+    return dict(results)
+
+
+def gather_live_data(subreddit_names: list[str], on_progress=None) -> dict:
+    """Sync wrapper around gather_live_data_async (must not be called from a running loop)."""
+    return asyncio.run(gather_live_data_async(subreddit_names, on_progress=on_progress))
 
 
 # ------------------------------------------------------------------
@@ -129,8 +178,7 @@ def _min_max_scale(values: dict) -> dict:
     return {k: (v - min_val) / (max_val - min_val) for k, v in values.items()}
 
 
-def _get_tolerance_score(subreddit: str, description: str, rules: list[str], api_key: str = "") -> float:
-    system_prompt = """You are an AI community guidelines analyzer. Read the provided subreddit description and rules.
+TOLERANCE_SYSTEM_PROMPT = """You are an AI community guidelines analyzer. Read the provided subreddit description and rules.
 Rate the subreddit's tolerance for self-promotion, marketing, or sharing new products on a scale from 0.0 to 1.0.
 0.0 = Strictly forbids all self-promotion, marketing, or links. Instant ban risk.
 0.5 = Allows it conditionally (e.g., only in specific megathreads, or requires high participation first).
@@ -138,63 +186,182 @@ Rate the subreddit's tolerance for self-promotion, marketing, or sharing new pro
 
 Output STRICTLY as a JSON object with a single key "tolerance_score" containing the float value."""
 
+TOLERANCE_CONCURRENCY = int(os.getenv("TOLERANCE_CONCURRENCY", "8"))
+
+# Verdicts only change when the subreddit's description or rules do, so they
+# are memoized by a fingerprint of exactly those inputs.
+_tolerance_cache = TTLCache(
+    maxsize=int(os.getenv("TOLERANCE_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("TOLERANCE_CACHE_TTL", str(7 * 86400))),
+    db_path=os.getenv("SCRAPE_CACHE_PATH") or None,
+    namespace="tolerance",
+)
+
+
+def cache_stats() -> dict:
+    return {"scrape": _scrape_cache.stats(), "tolerance": _tolerance_cache.stats()}
+
+
+def _tolerance_fingerprint(subreddit: str, description: str, rules: list[str]) -> str:
+    payload = json.dumps([subreddit.lower(), description, rules], separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def _get_tolerance_score(subreddit: str, description: str, rules: list[str], api_key: str = "") -> float:
+    key = _tolerance_fingerprint(subreddit, description, rules)
+    cached = await _tolerance_cache.aget(key)
+    if cached is not None:
+        return cached
+
     content = f"Subreddit: {subreddit}\nDescription: {description}\nRules: {json.dumps(rules)}"
 
     try:
-        _client = Anthropic(api_key=api_key or os.getenv("ANTHROPIC_API_KEY"))
-        response = _client.messages.create(
+        response = await create_message(
+            api_key,
             model="claude-haiku-4-5-20251001",
             max_tokens=150,
-            system=system_prompt,
+            system=[cached_block(TOLERANCE_SYSTEM_PROMPT)],
             messages=[
                 {"role": "user", "content": content},
                 {"role": "assistant", "content": "{"},
             ],
         )
         parsed = json.loads("{" + response.content[0].text)
-        return float(parsed.get("tolerance_score", 0.0))
+        score = float(parsed.get("tolerance_score", 0.0))
+        _tolerance_cache.set(key, score)
+        return score
     except Exception as e:
+        # Not cached: a transient API failure shouldn't stick for a week
         print(f"[scraper] Error getting tolerance for {subreddit}: {e}")
         return 0.0
 
 
-def rank_subreddits(scraped_data: dict, product_description: str, on_progress=None, api_key: str = "") -> list[dict]:
-    """Score & rank subreddits using semantic similarity, tolerance, and activity."""
-    W_SEMANTIC = 0.55
-    W_TOLERANCE = 0.25
-    W_ACTIVITY = 0.20
+async def score_tolerance_async(scraped_data: dict, api_key: str = "", on_progress=None) -> dict:
+    """Tolerance scores for all subreddits, scored concurrently on the shared client."""
+    semaphore = asyncio.Semaphore(TOLERANCE_CONCURRENCY)
+    total = len(scraped_data)
+    done = 0
 
-    model = _get_embed_model()
-    product_emb = model.encode([product_description])
+    async def _score(sub: str):
+        nonlocal done
+        data = scraped_data[sub]
+        async with semaphore:
+            score = await _get_tolerance_score(sub, data.get("description", ""), data.get("rules", []), api_key=api_key)
+        if on_progress:
+            on_progress("scoring", sub, done, total)
+        done += 1
+        return sub, score
 
-    raw_semantic = {}
-    raw_activity = {}
-    tolerance_scores = {}
+    return dict(await asyncio.gather(*[_score(sub) for sub in scraped_data]))
 
-    subs = list(scraped_data.keys())
-    total = len(subs)
 
-    for i, sub in enumerate(subs):
-        if on_progress:
-            on_progress("scoring", sub, i, total)
+def _subreddit_context(data: dict) -> str:
+    """Text that represents a subreddit for semantic matching."""
+    posts = data.get("recent_posts", [])
+    return data.get("description", "") + " " + " ".join(p.get("title", "") for p in posts)
 
-        data = scraped_data[sub]
-        posts = data.get("recent_posts", [])
 
-        # Activity: log-normalized median upvotes
-        upvotes = [p.get("upvotes", 0) for p in posts]
-        median_up = float(np.median(upvotes)) if upvotes else 0
-        raw_activity[sub] = math.log(median_up + 1)
+def _semantic_scores_and_vectors(contexts: dict, product_description: str) -> tuple[dict, dict]:
+    """Cosine similarity of every subreddit context to the product description,
+    plus the context embeddings themselves (for the catalog).
 
-        # Semantic: cosine similarity between product desc and sub context
-        sub_context = data.get("description", "") + " " + " ".join(p.get("title", "") for p in posts)
-        sub_emb = model.encode([sub_context])
-        raw_semantic[sub] = float(cosine_similarity(product_emb, sub_emb)[0][0])
+    The product description and all contexts go through the model in a single
+    batched encode (texts already in the embedding store are skipped); with
+    normalized embeddings the similarities are one matrix-vector product.
+    """
+    if not contexts:
+        return {}, {}
+    subs = list(contexts.keys())
+    embeddings = embed([product_description] + [contexts[s] for s in subs])
+    sims = embeddings[1:] @ embeddings[0]
+    return {sub: float(sim) for sub, sim in zip(subs, sims)}, dict(zip(subs, embeddings[1:]))
 
-        # Tolerance: Claude evaluates self-promo friendliness
-        tolerance_scores[sub] = _get_tolerance_score(sub, data.get("description", ""), data.get("rules", []), api_key=api_key)
 
-    scaled_semantic = _min_max_scale(raw_semantic)
+def _semantic_scores(contexts: dict, product_description: str) -> dict:
+    """Cosine similarity of every subreddit context to the product description."""
+    return _semantic_scores_and_vectors(contexts, product_description)[0]
+
+
+class _EmbedBatcher:
+    """Coalesces concurrent single-text embed requests.
+
+    Texts that arrive while a batch is encoding are queued and go through the
+    model together in the next batch, so a streaming pipeline still gets
+    batched forward passes without waiting on a fixed window.
+    """
+
+    def __init__(self):
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._task = None
+
+    async def embed(self, text: str) -> np.ndarray:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((text, future))
+        if self._task is None:
+            self._task = asyncio.create_task(self._drain())
+        return await future
+
+    async def _drain(self) -> None:
+        try:
+            while self._pending:
+                batch, self._pending = self._pending, []
+                try:
+                    vectors = await run_blocking(embed, [text for text, _ in batch])
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for (_, future), vector in zip(batch, vectors):
+                    if not future.done():
+                        future.set_result(vector)
+        finally:
+            self._task = None
+
+
+_catalog_tasks: set[asyncio.Task] = set()  # strong refs until the writes finish
+
+
+def _record_in_catalog(scraped_data: dict, vectors: dict, tolerance_scores: dict) -> None:
+    """Add scored subreddits (with the context embeddings scoring already
+    computed) to the local catalog discovery searches, in the background."""
+    async def _record() -> None:
+        try:
+            await run_blocking(subreddit_catalog.record, scraped_data, vectors, tolerance_scores)
+        except Exception as e:
+            print(f"[scraper] Catalog update failed: {e}")
+
+    task = asyncio.create_task(_record())
+    _catalog_tasks.add(task)
+    task.add_done_callback(_catalog_tasks.discard)
+
+
+async def _with_catalog_writes(coro):
+    """Await coro, then the catalog writes it started on this loop. For the
+    asyncio.run() wrappers, whose loop would otherwise cancel them on exit."""
+    result = await coro
+    loop = asyncio.get_running_loop()
+    pending = [task for task in _catalog_tasks if task.get_loop() is loop]
+    if pending:
+        await asyncio.gather(*pending)
+    return result
+
+
+def _activity_score(data: dict) -> float:
+    """Log-normalized median upvotes of the hot posts."""
+    upvotes = [p.get("upvotes", 0) for p in data.get("recent_posts", [])]
+    median_up = float(np.median(upvotes)) if upvotes else 0
+    return math.log(median_up + 1)
+
+
+def _build_rankings(scraped_data: dict, raw_semantic: dict, tolerance_scores: dict) -> list[dict]:
+    """Scale the raw factors across `scraped_data` and combine them into a ranking."""
+    W_SEMANTIC = 0.55
+    W_TOLERANCE = 0.25
+    W_ACTIVITY = 0.20
+
+    raw_activity = {sub: _activity_score(scraped_data[sub]) for sub in scraped_data}
+    scaled_semantic = _min_max_scale({sub: raw_semantic[sub] for sub in scraped_data if sub in raw_semantic})
     scaled_activity = _min_max_scale(raw_activity)
 
     rankings = []
@@ -223,6 +390,30 @@ def rank_subreddits(scraped_data: dict, product_description: str, on_progress=No
     return rankings
 
 
+async def rank_subreddits_async(scraped_data: dict, product_description: str, on_progress=None, api_key: str = "") -> list[dict]:
+    """Score & rank subreddits using semantic similarity, tolerance, and activity.
+
+    The batched embedding runs in a worker thread while the tolerance calls
+    are in flight, so scoring costs roughly one LLM round-trip.
+    """
+    contexts = {sub: _subreddit_context(data) for sub, data in scraped_data.items()}
+    (raw_semantic, vectors), tolerance_scores = await asyncio.gather(
+        # Semantic: cosine similarity between product desc and sub context
+        run_blocking(_semantic_scores_and_vectors, contexts, product_description),
+        # Tolerance: Claude evaluates self-promo friendliness
+        score_tolerance_async(scraped_data, api_key=api_key, on_progress=on_progress),
+    )
+    _record_in_catalog(scraped_data, vectors, tolerance_scores)
+    return _build_rankings(scraped_data, raw_semantic, tolerance_scores)
+
+
+def rank_subreddits(scraped_data: dict, product_description: str, on_progress=None, api_key: str = "") -> list[dict]:
+    """Sync wrapper around rank_subreddits_async (must not be called from a running loop)."""
+    return asyncio.run(_with_catalog_writes(
+        rank_subreddits_async(scraped_data, product_description, on_progress=on_progress, api_key=api_key)
+    ))
+
+
 # ------------------------------------------------------------------
 # Main entry point for the API
 # ------------------------------------------------------------------
@@ -240,42 +431,84 @@ def scrape_and_rank(subreddit_names: list[str], product_description: str, api_ke
     }
 
 
-def scrape_and_rank_stream(subreddit_names: list[str], product_description: str, api_key: str = ""):
-    """
-    Generator version that yields SSE progress events.
-    Scraping = 0-60%, Scoring = 60-95%, Done = 100%.
-    Yields: dict with {phase, subreddit, progress, message}
-    Final yield has phase="done" and includes full results.
-    """
-    total = len(subreddit_names)
+async def scrape_and_rank_async(subreddit_names: list[str], product_description: str, api_key: str = "") -> dict:
+    """Same as scrape_and_rank, but scrapes and scores on the caller's event loop."""
+    live_data = await gather_live_data_async(subreddit_names)
+    rankings = await rank_subreddits_async(live_data, product_description, api_key=api_key)
+    return {
+        "subreddits": rankings,
+        "total": len(rankings),
+    }
 
-    def on_scrape_progress(phase, sub, idx, total_subs):
-        pass  # handled inline below
 
-    # --- Phase 1: Scraping (0% to 60%) ---
-    live_data = {}
-    for i, sub in enumerate(subreddit_names):
-        pct = int((i / total) * 60)
-        yield {"phase": "scraping", "subreddit": sub, "progress": pct,
-               "message": f"Scraping r/{sub}... ({i+1}/{total})"}
-        about = scrape_subreddit_about(sub)
-        live_data[sub] = {
-            "description": about.get("description", ""),
-            "subscribers": about.get("subscribers", 0),
-            "active_users": about.get("active_users", 0),
-            "rules": scrape_subreddit_rules(sub),
-            "recent_posts": scrape_subreddit_posts(sub),
-        }
-
-    # --- Phase 2: Scoring (60% to 95%) ---
-    for i, sub in enumerate(subreddit_names):
-        pct = 60 + int((i / total) * 35)
-        yield {"phase": "scoring", "subreddit": sub, "progress": pct,
-               "message": f"Scoring r/{sub}... ({i+1}/{total})"}
+async def scrape_and_rank_stream(subreddit_names: list[str], product_description: str, api_key: str = ""):
+    """
+    Async generator that yields SSE progress events.
 
-    rankings = rank_subreddits(live_data, product_description, api_key=api_key)
+    Every subreddit runs through its own fetch → embed → tolerance pipeline,
+    so fast subreddits are scored while slow ones are still being fetched.
+    Each "scoring" event carries a provisional ranking (`partial`) over the
+    subreddits scored so far; the final "done" event re-normalizes across all.
+    Progress: each scrape is worth 60/N %, each score 35/N %, done = 100%.
+    """
+    subs = list(dict.fromkeys(subreddit_names))
+    total = len(subs) or 1
+    queue: asyncio.Queue = asyncio.Queue()
+    batcher = _EmbedBatcher()
+    semaphore = asyncio.Semaphore(TOLERANCE_CONCURRENCY)
+    product_vec = asyncio.ensure_future(batcher.embed(product_description))
+
+    async def _tolerance(sub: str, data: dict) -> float:
+        async with semaphore:
+            return await _get_tolerance_score(sub, data.get("description", ""), data.get("rules", []), api_key=api_key)
+
+    async def _pipeline(sub: str) -> None:
+        try:
+            data = await scrape_subreddit_async(sub)
+            await queue.put(("scraped", sub, data))
+            sub_vec, tolerance = await asyncio.gather(
+                batcher.embed(_subreddit_context(data)),
+                _tolerance(sub, data),
+            )
+            semantic = float(sub_vec @ await product_vec)
+            context_vectors[sub] = sub_vec
+            await queue.put(("scored", sub, semantic, tolerance))
+        except Exception as e:
+            await queue.put(("error", sub, e))
 
-    # --- Done ---
+    live_data = {}
+    raw_semantic = {}
+    tolerance_scores = {}
+    context_vectors = {}
+    tasks = [asyncio.create_task(_pipeline(sub)) for sub in subs]
+    try:
+        for _ in range(2 * len(subs)):
+            kind, sub, *payload = await queue.get()
+            if kind == "error":
+                raise payload[0]
+
+            if kind == "scraped":
+                live_data[sub] = payload[0]
+                pct = int((len(live_data) * 60 + len(raw_semantic) * 35) / total)
+                yield {"phase": "scraping", "subreddit": sub, "progress": pct,
+                       "message": f"Scraped r/{sub} ({len(live_data)}/{total})"}
+                continue
+
+            raw_semantic[sub], tolerance_scores[sub] = payload
+            scored = {s: live_data[s] for s in subs if s in raw_semantic}
+            partial = _build_rankings(scored, raw_semantic, tolerance_scores)
+            pct = int((len(live_data) * 60 + len(raw_semantic) * 35) / total)
+            yield {"phase": "scoring", "subreddit": sub, "progress": pct,
+                   "message": f"Scored r/{sub} ({len(raw_semantic)}/{total})",
+                   "partial": {"subreddits": partial, "total": len(partial)}}
+    finally:
+        for task in tasks + [product_vec]:
+            task.cancel()
+        await asyncio.gather(*tasks, product_vec, return_exceptions=True)
+
+    # --- Done: re-normalize across every subreddit ---
+    _record_in_catalog(live_data, context_vectors, tolerance_scores)
+    rankings = _build_rankings({s: live_data[s] for s in subs}, raw_semantic, tolerance_scores)
     result = {"subreddits": rankings, "total": len(rankings)}
     yield {"phase": "done", "progress": 100, "message": "Analysis complete",
            "result": result}
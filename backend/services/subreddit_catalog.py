@@ -0,0 +1,199 @@
+"""
+Local subreddit catalog
+
+Every subreddit that goes through scoring is recorded here: description,
+subscribers, rules, self-promo tolerance and the MiniLM embedding of its
+context (description + recent titles, the same text rank_subreddits scores).
+Discovery searches it first, so products in niches we have seen before get
+verified candidates in milliseconds, and the LLM only fills the gaps.
+
+Rows live in SQLite (SUBREDDIT_CATALOG_PATH), vectors as float32 blobs
+tagged with the embedding backend that produced them. The search index is a
+flat in-memory matrix of normalized vectors built from the rows on first
+use: exact inner-product search, which stays in the low milliseconds up to
+~100k subreddits, well past what an IVF index would pay off for.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+
+from services import embedding_model
+
+load_dotenv()
+
+CATALOG_PATH = Path(os.getenv(
+    "SUBREDDIT_CATALOG_PATH", str(Path(__file__).parent.parent / "data" / "subreddit_catalog.sqlite3")
+))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subreddits (
+    name         TEXT PRIMARY KEY,   -- lowercase, no r/ prefix
+    display_name TEXT NOT NULL,
+    description  TEXT NOT NULL,
+    subscribers  INTEGER NOT NULL DEFAULT 0,
+    active_users INTEGER NOT NULL DEFAULT 0,
+    over18       INTEGER NOT NULL DEFAULT 0,
+    rules        TEXT NOT NULL,      -- JSON list
+    tolerance    REAL,
+    model        TEXT NOT NULL,      -- embedding_model.store_name() of the vector
+    vector       BLOB NOT NULL,      -- float32, normalized
+    times_seen   INTEGER NOT NULL DEFAULT 1,
+    updated_at   REAL NOT NULL
+);
+"""
+
+
+class FlatIndex:
+    """Exact nearest-neighbour search over normalized vectors (brute-force inner product)."""
+
+    def __init__(self):
+        self.names: list[str] = []
+        self._rows: dict[str, int] = {}
+        self._vectors: list[np.ndarray] = []
+        self._matrix: np.ndarray | None = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def upsert(self, name: str, vector: np.ndarray) -> None:
+        vector = np.asarray(vector, dtype=np.float32)
+        if name in self._rows:
+            self._vectors[self._rows[name]] = vector
+        else:
+            self._rows[name] = len(self.names)
+            self.names.append(name)
+            self._vectors.append(vector)
+        self._matrix = None  # rebuilt on the next search
+
+    def search(self, vector: np.ndarray, k: int) -> list[tuple[str, float]]:
+        if not self.names or k <= 0:
+            return []
+        if self._matrix is None:
+            self._matrix = np.stack(self._vectors)
+        sims = self._matrix @ np.asarray(vector, dtype=np.float32)
+        k = min(k, len(sims))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return [(self.names[i], float(sims[i])) for i in top]
+
+
+_conn: sqlite3.Connection | None = None
+_index: FlatIndex | None = None
+_meta: dict[str, dict] = {}  # name -> row fields the search filters and reports on
+_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    """Shared connection (caller holds _lock)."""
+    global _conn
+    if _conn is None:
+        CATALOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+        _conn = sqlite3.connect(str(CATALOG_PATH), check_same_thread=False, timeout=30)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.executescript(SCHEMA)
+    return _conn
+
+
+def _load_index() -> FlatIndex:
+    """Flat index over the rows embedded by the current backend (caller holds _lock)."""
+    global _index
+    if _index is None:
+        index = FlatIndex()
+        rows = _connect().execute(
+            "SELECT name, display_name, description, subscribers, over18, tolerance, vector"
+            " FROM subreddits WHERE model = ?",
+            (embedding_model.store_name(),),
+        )
+        for name, display_name, description, subscribers, over18, tolerance, vector in rows:
+            index.upsert(name, np.frombuffer(vector, dtype=np.float32))
+            _meta[name] = {"name": display_name, "description": description, "subscribers": subscribers,
+                           "over18": bool(over18), "tolerance": tolerance}
+        _index = index
+        print(f"[catalog] Loaded {len(index)} subreddits from {CATALOG_PATH}")
+    return _index
+
+
+def record(scraped_data: dict, vectors: dict, tolerance_scores: dict | None = None) -> int:
+    """Upsert scored subreddits; returns how many were recorded (blocking).
+
+    scraped_data is gather_live_data()'s output, vectors the normalized
+    embedding of each subreddit's context (as scored by rank_subreddits).
+    A "display_name" in the data (Reddit's own casing) wins over the
+    scraped_data key. Subreddits whose scrape came back empty (banned,
+    private or a failed fetch) are skipped.
+    """
+    tolerance_scores = tolerance_scores or {}
+    subs = [s for s, d in scraped_data.items()
+            if s in vectors and (d.get("description") or d.get("subscribers"))]
+    if not subs:
+        return 0
+    model = embedding_model.store_name()
+    now = time.time()
+    with _lock:
+        index = _load_index()
+        conn = _connect()
+        with conn:
+            for sub in subs:
+                data, name = scraped_data[sub], sub.lower().removeprefix("r/")
+                display_name = data.get("display_name") or sub
+                vector = np.asarray(vectors[sub], dtype=np.float32)
+                conn.execute(
+                    "INSERT INTO subreddits (name, display_name, description, subscribers, active_users,"
+                    " over18, rules, tolerance, model, vector, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                    # A bare lowercase key doesn't replace a properly cased name we already have
+                    " ON CONFLICT (name) DO UPDATE SET display_name = CASE WHEN excluded.display_name = excluded.name"
+                    " THEN display_name ELSE excluded.display_name END,"
+                    " description = excluded.description, subscribers = excluded.subscribers,"
+                    " active_users = excluded.active_users, over18 = excluded.over18, rules = excluded.rules,"
+                    " tolerance = COALESCE(excluded.tolerance, tolerance), model = excluded.model,"
+                    " vector = excluded.vector, times_seen = times_seen + 1, updated_at = excluded.updated_at",
+                    (name, display_name, data.get("description", ""), data.get("subscribers", 0),
+                     data.get("active_users", 0), int(bool(data.get("over18"))),
+                     json.dumps(data.get("rules", [])), tolerance_scores.get(sub), model,
+                     vector.tobytes(), now),
+                )
+                index.upsert(name, vector)
+                previous = _meta.get(name, {})
+                if display_name == name and previous.get("name"):
+                    display_name = previous["name"]
+                _meta[name] = {"name": display_name, "description": data.get("description", ""),
+                               "subscribers": data.get("subscribers", 0), "over18": bool(data.get("over18")),
+                               "tolerance": tolerance_scores.get(sub, previous.get("tolerance"))}
+    return len(subs)
+
+
+def search(vector: np.ndarray, k: int = 5, min_similarity: float = 0.0, min_subscribers: int = 0) -> list[dict]:
+    """Up to k catalog subreddits closest to `vector` (normalized), best first.
+
+    NSFW subreddits and ones below the similarity / subscriber floors are
+    left out. Each result is the stored metadata plus "similarity".
+    """
+    with _lock:
+        index = _load_index()
+        # Over-fetch so filtering still leaves k when the closest ones are excluded
+        hits = index.search(vector, k * 4)
+        results = []
+        for name, similarity in hits:
+            meta = _meta[name]
+            if similarity < min_similarity:
+                break
+            if meta["over18"] or meta["subscribers"] < min_subscribers:
+                continue
+            results.append({**meta, "similarity": similarity})
+            if len(results) == k:
+                break
+    return results
+
+
+def stats() -> dict:
+    with _lock:
+        size = len(_index) if _index is not None else None
+    return {"size": size, "path": str(CATALOG_PATH), "model": embedding_model.store_name()}
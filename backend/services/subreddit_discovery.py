@@ -1,11 +1,46 @@
-import os
 import json
-from anthropic import Anthropic
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from services.llm_scheduler import create_message
+from services import embedding_model, subreddit_catalog
+from services.worker_pool import run_blocking
 from dotenv import load_dotenv
 from models.schemas import ProductInput, SubredditResult, DiscoveryResponse
 
 load_dotenv()
 
+DISCOVERY_MODEL = "claude-sonnet-4-6"
+
+# Per-mode request settings. "thorough" reasons with extended thinking;
+# "fast" answers directly, which is several times quicker and cheaper.
+MODES = {
+    "thorough": {"max_tokens": 16000, "thinking": {"type": "enabled", "budget_tokens": 5000}},
+    "fast": {"max_tokens": 1024},
+}
+
+# Semantic cache: a product whose embedding is at least this close (cosine)
+# to a cached one reuses its subreddits. DISCOVERY_CACHE_SIZE=0 disables it.
+CACHE_THRESHOLD = float(os.getenv("DISCOVERY_CACHE_THRESHOLD", "0.95"))
+CACHE_SIZE = int(os.getenv("DISCOVERY_CACHE_SIZE", "256"))
+CACHE_TTL = float(os.getenv("DISCOVERY_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Thresholds /api/metrics reports "would have hit" rates for
+THRESHOLD_PROBES = (0.85, 0.9, 0.93, 0.95, 0.97, 0.99)
+
+# Local catalog of scored subreddits (services.subreddit_catalog), searched
+# before the LLM. Matches above CATALOG_MIN_SIMILARITY are candidates; the LLM
+# is only skipped when all 5 clear the stricter CATALOG_SERVE_SIMILARITY,
+# otherwise its picks are merged in ahead of the weaker matches.
+CATALOG_DISCOVERY = os.getenv("CATALOG_DISCOVERY", "1") != "0"
+CATALOG_MIN_SIMILARITY = float(os.getenv("CATALOG_MIN_SIMILARITY", "0.5"))
+CATALOG_SERVE_SIMILARITY = float(os.getenv("CATALOG_SERVE_SIMILARITY", "0.65"))
+CATALOG_MIN_SUBSCRIBERS = int(os.getenv("CATALOG_MIN_SUBSCRIBERS", "10000"))
+DISCOVERY_COUNT = 5
+
 SYSTEM_PROMPT = """You are an expert Reddit marketing strategist with deep knowledge of Reddit's community ecosystem.
 
 Your task: Given a product description, identify exactly 5 real, active Reddit subreddits where this product's target audience congregates.
@@ -32,12 +67,213 @@ Example:
 ]"""
 
 
-def discover_subreddits(product: ProductInput, api_key: str = "") -> DiscoveryResponse:
+class SemanticCache:
+    """Discovery results keyed by product embedding, matched by nearest neighbour.
+
+    A linear scan over a small (CACHE_SIZE x 384) matrix; the oldest entry is
+    evicted when full. A thorough result may serve a fast request, never the
+    other way round.
     """
-    Takes product input, calls Claude Sonnet 4.6 with adaptive thinking,
-    returns 5 subreddit URLs.
+
+    def __init__(self, maxsize: int, ttl: float, threshold: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self._vectors: list[np.ndarray] = []
+        self._entries: list[dict] = []  # {"mode", "subreddits", "expires_at"}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._best = deque(maxlen=1000)  # best neighbour similarity per lookup
+
+    def _expire(self) -> None:
+        now = time.time()
+        keep = [i for i, e in enumerate(self._entries) if e["expires_at"] > now]
+        if len(keep) != len(self._entries):
+            self._vectors = [self._vectors[i] for i in keep]
+            self._entries = [self._entries[i] for i in keep]
+
+    def lookup(self, vector: np.ndarray, mode: str) -> tuple[list[dict] | None, float]:
+        """(subreddits, similarity) of the closest usable entry; subreddits is None on a miss."""
+        with self._lock:
+            self._expire()
+            usable = [i for i, e in enumerate(self._entries) if mode == "fast" or e["mode"] == mode]
+            best, similarity = None, 0.0
+            if usable:
+                sims = np.stack([self._vectors[i] for i in usable]) @ vector
+                j = int(np.argmax(sims))
+                best, similarity = usable[j], float(sims[j])
+            self._best.append(similarity)
+            if best is not None and similarity >= self.threshold:
+                self.hits += 1
+                return json.loads(json.dumps(self._entries[best]["subreddits"])), similarity
+            self.misses += 1
+            return None, similarity
+
+    def add(self, vector: np.ndarray, mode: str, subreddits: list[dict]) -> None:
+        with self._lock:
+            self._vectors.append(vector)
+            self._entries.append({"mode": mode, "subreddits": subreddits, "expires_at": time.time() + self.ttl})
+            if len(self._entries) > self.maxsize:
+                del self._vectors[0], self._entries[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            best = list(self._best)
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            # Share of recent lookups that would have hit at each threshold
+            "would_hit_at": {
+                str(t): round(sum(s >= t for s in best) / len(best), 3) if best else 0.0
+                for t in THRESHOLD_PROBES
+            },
+        }
+
+
+_cache = SemanticCache(CACHE_SIZE, CACHE_TTL, CACHE_THRESHOLD)
+
+# Recent end-to-end latencies (seconds) of /api/discover by outcome
+_latency = {kind: deque(maxlen=200) for kind in ("cache_hit", "catalog", "thorough", "fast")}
+_catalog_counts = {"served": 0, "llm_fills": 0}
+_latency_lock = threading.Lock()
+
+
+def _record_latency(kind: str, seconds: float, catalog_count: str | None = None) -> None:
+    """Record a request's latency, and bump a catalog counter in the same step."""
+    with _latency_lock:
+        _latency[kind].append(seconds)
+        if catalog_count:
+            _catalog_counts[catalog_count] += 1
+
+
+def stats() -> dict:
+    """Semantic-cache counters and recent latency percentiles for /api/metrics."""
+    with _latency_lock:
+        samples = {kind: sorted(values) for kind, values in _latency.items()}
+        catalog_counts = dict(_catalog_counts)
+    return {
+        "cache": _cache.stats(),
+        "catalog": {**subreddit_catalog.stats(), **catalog_counts, "min_similarity": CATALOG_MIN_SIMILARITY,
+                    "serve_similarity": CATALOG_SERVE_SIMILARITY},
+        "latency": {
+            kind: {
+                "count": len(values),
+                "p50": round(values[len(values) // 2], 3),
+                "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
+            } if values else {"count": 0}
+            for kind, values in samples.items()
+        },
+    }
+
+
+def _product_text(product: ProductInput) -> str:
+    """Whitespace- and keyword-order-insensitive text the cache embeds."""
+    keywords = sorted({" ".join(k.split()).lower() for k in product.keywords if k.strip()})
+    parts = [product.product_name, product.product_description, product.niche_category, product.target_audience]
+    return "\n".join(" ".join(p.split()) for p in parts) + "\nKeywords: " + ", ".join(keywords)
+
+
+async def _product_vector(product: ProductInput) -> np.ndarray | None:
+    # Don't queue behind a warm-up still loading the model; the LLM is the fallback anyway
+    if (CACHE_SIZE <= 0 and not CATALOG_DISCOVERY) or embedding_model.status()["status"] == "loading":
+        return None
+    try:
+        return (await run_blocking(embedding_model.embed, [_product_text(product)]))[0]
+    except Exception as e:
+        print(f"[discovery] Semantic cache and catalog unavailable, embedding failed: {e}")
+        return None
+
+
+async def _catalog_hits(vector: np.ndarray) -> list[dict]:
+    """Closest catalog subreddits, best first; [] if the catalog can't be read."""
+    try:
+        # The first search loads the index from SQLite
+        return await run_blocking(
+            subreddit_catalog.search, vector, DISCOVERY_COUNT,
+            min_similarity=CATALOG_MIN_SIMILARITY, min_subscribers=CATALOG_MIN_SUBSCRIBERS,
+        )
+    except Exception as e:
+        print(f"[discovery] Catalog search failed: {e}")
+        return []
+
+
+def _catalog_reason(hit: dict) -> str:
+    """The subreddit's own description (first sentence), plus size and fit."""
+    fit = f"{hit['subscribers']:,} members, {hit['similarity']:.0%} semantic fit"
+    about = " ".join(hit["description"].split()).split(". ")[0].rstrip(".")
+    if not about:
+        return f"Close match from previously analyzed communities ({fit})"
+    if len(about) > 140:
+        about = about[:137].rstrip() + "..."
+    return f"{about} ({fit})"
+
+
+def _catalog_results(hits: list[dict]) -> list[dict]:
+    return [{
+        "name": f"r/{hit['name']}",
+        "url": f"https://www.reddit.com/r/{hit['name']}",
+        "reason": _catalog_reason(hit),
+    } for hit in hits]
+
+
+def _merge(*groups: list[dict]) -> list[dict]:
+    """The groups' subreddits in order, without duplicates, capped at DISCOVERY_COUNT."""
+    seen = set()
+    merged = []
+    for s in (s for group in groups for s in group):
+        if s["name"].lower() not in seen:
+            seen.add(s["name"].lower())
+            merged.append(s)
+    return merged[:DISCOVERY_COUNT]
+
+
+def _response(product: ProductInput, subreddits: list[dict], cached: bool) -> DiscoveryResponse:
+    return DiscoveryResponse(
+        product_name=product.product_name,
+        subreddits=[SubredditResult(**s) for s in subreddits],
+        cached=cached,
+    )
+
+
+async def discover_subreddits(product: ProductInput, api_key: str = "") -> DiscoveryResponse:
+    """
+    Takes product input, returns 5 subreddit URLs: from the semantic cache
+    when a near-identical product was seen recently, else from the local
+    catalog when it has 5 strong matches, otherwise Claude Sonnet 4.6's picks
+    (with extended thinking unless product.mode is "fast") merged with the
+    catalog's: strong matches first, weaker ones only to fill gaps.
     """
+    started = time.perf_counter()
+    mode = product.mode if product.mode in MODES else "thorough"
+    vector = await _product_vector(product)
+    if vector is not None and CACHE_SIZE > 0:
+        cached, similarity = _cache.lookup(vector, mode)
+        if cached is not None:
+            print(f"[discovery] Cache hit (similarity {similarity:.3f}) for {product.product_name!r}")
+            _record_latency("cache_hit", time.perf_counter() - started)
+            return _response(product, cached, cached=True)
+
+    hits = await _catalog_hits(vector) if vector is not None and CATALOG_DISCOVERY else []
+    strong = [hit for hit in hits if hit["similarity"] >= CATALOG_SERVE_SIMILARITY]
+    if len(strong) >= DISCOVERY_COUNT:
+        _record_latency("catalog", time.perf_counter() - started, catalog_count="served")
+        return _response(product, _catalog_results(strong), cached=False)
 
+    weak = hits[len(strong):]
+    subreddits = _merge(_catalog_results(strong), await _ask_llm(product, api_key, mode), _catalog_results(weak))
+    if vector is not None and CACHE_SIZE > 0:
+        _cache.add(vector, mode, subreddits)
+    _record_latency(mode, time.perf_counter() - started, catalog_count="llm_fills" if hits else None)
+    return _response(product, subreddits, cached=False)
+
+
+async def _ask_llm(product: ProductInput, api_key: str, mode: str) -> list[dict]:
     user_prompt = f"""Find 5 relevant Reddit subreddits for this product:
 
 Product Name: {product.product_name}
@@ -48,14 +284,10 @@ Keywords: {', '.join(product.keywords)}
 
 Return exactly 5 subreddits as a JSON array."""
 
-    client = Anthropic(api_key=api_key or os.getenv("ANTHROPIC_API_KEY"))
-    response = client.messages.create(
-        model="claude-sonnet-4-6",
-        max_tokens=16000,
-        thinking={
-            "type": "enabled",
-            "budget_tokens": 5000
-        },
+    response = await create_message(
+        api_key,
+        model=DISCOVERY_MODEL,
+        **MODES[mode],
         system=SYSTEM_PROMPT,
         messages=[
             {"role": "user", "content": user_prompt}
@@ -81,14 +313,11 @@ Return exactly 5 subreddits as a JSON array."""
 
     subreddits = []
     for item in parsed[:5]:  # enforce max 5
-        name = item["name"].strip().lstrip("r/").lstrip("/r/")
-        subreddits.append(SubredditResult(
-            name=f"r/{name}",
-            url=f"https://www.reddit.com/r/{name}",
-            reason=item["reason"]
-        ))
+        name = item["name"].strip().removeprefix("/").removeprefix("r/")
+        subreddits.append({
+            "name": f"r/{name}",
+            "url": f"https://www.reddit.com/r/{name}",
+            "reason": item["reason"]
+        })
 
-    return DiscoveryResponse(
-        product_name=product.product_name,
-        subreddits=subreddits
-    )
+    return subreddits
@@ -0,0 +1,197 @@
+"""
+TTL + LRU cache with optional SQLite backing
+
+Values must be JSON-serializable. They are stored serialized, so callers
+always get a fresh copy and can mutate it freely. When a db_path is given,
+entries are written through to SQLite and survive restarts; the in-memory
+LRU stays in front of it.
+
+The caches are used from the event loop, so disk writes never happen in
+the caller: set/delete/clear update memory and queue the SQLite statement
+for a per-cache writer thread, which commits in batches (WAL,
+synchronous=NORMAL). Only a memory miss reads from disk; aget() does that
+read on the worker pool.
+"""
+
+import atexit
+import json
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from services.worker_pool import run_blocking
+
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0, db_path: str | Path | None = None,
+                 namespace: str = "default"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.namespace = namespace
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._db = None  # read connection; writes go through the writer thread's own
+        self._pending: queue.Queue = queue.Queue()
+        if db_path:
+            self._db_path = str(db_path)
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = self._connect()
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL, stored_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            self._db.commit()
+            self._prune_disk(self._db)
+            threading.Thread(target=self._write_loop, name=f"ttl-cache-{namespace}", daemon=True).start()
+            atexit.register(self.flush)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._db_path, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: commits don't fsync; a power loss can only drop the newest entries
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # -- disk writer (own thread and connection) --
+
+    def _write_loop(self) -> None:
+        conn = self._connect()
+        while True:
+            batch = [self._pending.get()]
+            while True:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with conn:
+                    for sql, params in batch:
+                        conn.execute(sql, params)
+                writes_before = self._writes
+                self._writes += len(batch)
+                if self._writes // 100 != writes_before // 100:
+                    self._prune_disk(conn)
+            except sqlite3.Error as e:
+                print(f"[ttl_cache] {self.namespace}: disk write failed: {e}")
+            finally:
+                for _ in batch:
+                    self._pending.task_done()
+
+    def _prune_disk(self, conn: sqlite3.Connection) -> None:
+        now = time.time()
+        conn.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND expires_at <= ?",
+            (self.namespace, now),
+        )
+        conn.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key NOT IN ("
+            " SELECT key FROM cache_entries WHERE namespace = ? ORDER BY stored_at DESC LIMIT ?)",
+            (self.namespace, self.namespace, self.maxsize),
+        )
+        conn.commit()
+
+    def flush(self) -> None:
+        """Block until every queued disk write is committed."""
+        if self._db is not None:
+            self._pending.join()
+
+    # -- internals (caller holds self._lock) --
+
+    def _evict_memory(self) -> None:
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _load(self, key: str, disk: bool = True):
+        if key in self._entries:
+            expires_at, raw = self._entries[key]
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                return raw
+            del self._entries[key]
+        if disk and self._db is not None:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row and row[1] > time.time():
+                self._entries[key] = (row[1], row[0])
+                self._evict_memory()
+                return row[0]
+        return _MISSING
+
+    # -- public API --
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            raw = self._load(key)
+            if raw is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+        return json.loads(raw)
+
+    async def aget(self, key: str, default=None):
+        """get() for the event loop: a memory miss reads SQLite on the worker pool."""
+        with self._lock:
+            raw = self._load(key, disk=False)
+            if raw is _MISSING and self._db is None:
+                self.misses += 1
+                return default
+            if raw is not _MISSING:
+                self.hits += 1
+        if raw is _MISSING:
+            return await run_blocking(self.get, key, default)
+        return json.loads(raw)
+
+    def set(self, key: str, value, ttl: float | None = None) -> None:
+        raw = json.dumps(value, separators=(",", ":"))
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, raw)
+            self._entries.move_to_end(key)
+            self._evict_memory()
+            if self._db is not None:
+                self._pending.put((
+                    "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at, stored_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (self.namespace, key, raw, expires_at, now),
+                ))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            if self._db is not None:
+                self._pending.put((
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                    (self.namespace, key),
+                ))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._pending.put(("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,)))
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "persistent": self._db is not None,
+            }
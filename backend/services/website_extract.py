@@ -1,12 +1,100 @@
-import os
+"""
+Website -> product form fields
+
+The page is streamed with a pooled HTTP client and fed chunk by chunk into
+an incremental HTML parser that keeps only what the prompt needs: meta/og
+tags (they sit in <head>, so they arrive first) and visible body text. The
+download stops as soon as enough text has been collected, or at
+WEBSITE_MAX_BYTES, so heavy landing pages cost a few KB instead of the
+whole document.
+"""
+import codecs
 import json
+import os
+import threading
+from html.parser import HTMLParser
+
 import httpx
-from bs4 import BeautifulSoup
-from anthropic import Anthropic
+from services.llm_scheduler import create_message
+from services.worker_pool import run_blocking
 from dotenv import load_dotenv
 
 load_dotenv()
 
+MAX_BYTES = int(os.getenv("WEBSITE_MAX_BYTES", str(1024 * 1024)))
+MAX_TEXT_CHARS = 3500
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (compatible; LexTrackAI/1.0)"
+}
+
+SKIP_TAGS = {"script", "style", "nav", "footer", "iframe", "noscript", "svg", "template"}
+META_NAMES = {"description", "og:description", "og:title", "og:site_name"}
+
+_client: httpx.Client | None = None
+_client_lock = threading.Lock()
+
+
+def _get_client() -> httpx.Client:
+    """Process-wide pooled client (httpx.Client is safe to share across worker threads)."""
+    global _client
+    with _client_lock:
+        if _client is None or _client.is_closed:
+            _client = httpx.Client(
+                headers=HEADERS,
+                follow_redirects=True,
+                timeout=15.0,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            )
+        return _client
+
+
+def close() -> None:
+    """Close the pooled client (call on shutdown)."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+class _PageTextParser(HTMLParser):
+    """Collects meta tags and visible text until `limit` characters of text are seen."""
+
+    def __init__(self, limit: int):
+        super().__init__(convert_charrefs=True)
+        self.limit = limit
+        self.meta: list[str] = []
+        self.parts: list[str] = []
+        self.chars = 0
+        self._skip_depth = 0
+
+    @property
+    def done(self) -> bool:
+        return self.chars > self.limit
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == "meta":
+            attrs = dict(attrs)
+            name = attrs.get("name") or attrs.get("property") or ""
+            content = attrs.get("content") or ""
+            if name.lower() in META_NAMES and content:
+                self.meta.append(f"{name}: {content}")
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if self._skip_depth or self.done:
+            return
+        text = " ".join(data.split())
+        if text:
+            self.parts.append(text)
+            self.chars += len(text) + 1
+
+
 EXTRACT_PROMPT = """You are a product analyst. Given the text content of a company website, extract the following fields for a marketing form.
 
 Return ONLY a valid JSON object with these exact keys:
@@ -25,46 +113,36 @@ def fetch_website_text(url: str) -> str:
     if not url.startswith(("http://", "https://")):
         url = "https://" + url
 
-    headers = {
-        "User-Agent": "Mozilla/5.0 (compatible; LexTrackAI/1.0)"
-    }
-
-    with httpx.Client(follow_redirects=True, timeout=15.0) as http:
-        resp = http.get(url, headers=headers)
+    parser = _PageTextParser(MAX_TEXT_CHARS)
+    received = 0
+    with _get_client().stream("GET", url) as resp:
         resp.raise_for_status()
-
-    soup = BeautifulSoup(resp.text, "html.parser")
-
-    # Remove noise
-    for tag in soup(["script", "style", "nav", "footer", "iframe", "noscript"]):
-        tag.decompose()
-
-    # Get text, collapse whitespace
-    text = soup.get_text(separator=" ", strip=True)
-
-    # Also grab meta description and og tags for extra signal
-    meta_parts = []
-    for meta in soup.find_all("meta"):
-        name = meta.get("name", "") or meta.get("property", "")
-        content = meta.get("content", "")
-        if name.lower() in ("description", "og:description", "og:title", "og:site_name") and content:
-            meta_parts.append(f"{name}: {content}")
-
-    meta_text = "\n".join(meta_parts)
+        try:
+            decoder = codecs.getincrementaldecoder(resp.charset_encoding or "utf-8")(errors="replace")
+        except LookupError:
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        for chunk in resp.iter_bytes():
+            received += len(chunk)
+            parser.feed(decoder.decode(chunk))
+            if parser.done or received >= MAX_BYTES:
+                break
+    parser.feed(decoder.decode(b"", final=True))
 
     # Truncate body text to keep token cost low
-    if len(text) > 3500:
-        text = text[:3500] + "..."
+    text = " ".join(parser.parts)
+    if len(text) > MAX_TEXT_CHARS:
+        text = text[:MAX_TEXT_CHARS] + "..."
 
+    meta_text = "\n".join(parser.meta)
     return f"{meta_text}\n\n{text}" if meta_text else text
 
 
-def extract_product_from_url(url: str, api_key: str = "") -> dict:
+async def extract_product_from_url(url: str, api_key: str = "") -> dict:
     """Fetch website, send to Claude Haiku for extraction, return form fields."""
-    website_text = fetch_website_text(url)
+    website_text = await run_blocking(fetch_website_text, url)
 
-    client = Anthropic(api_key=api_key or os.getenv("ANTHROPIC_API_KEY"))
-    response = client.messages.create(
+    response = await create_message(
+        api_key,
         model="claude-sonnet-4-6",
         max_tokens=1024,
         system=EXTRACT_PROMPT,
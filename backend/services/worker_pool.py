@@ -0,0 +1,27 @@
+"""
+Bounded worker pool for blocking work
+
+Async handlers must never block the event loop. Anything that still has to
+run synchronously (CPU-bound embedding, sync SDK calls, file I/O) goes
+through run_blocking(), which uses one process-wide, fixed-size thread pool
+instead of the loop's default executor or ad-hoc threads.
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", "16"))
+
+_executor = ThreadPoolExecutor(max_workers=WORKER_POOL_SIZE, thread_name_prefix="lextrack-worker")
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run func(*args, **kwargs) on the shared pool and await the result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+def shutdown() -> None:
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("tokenizers")
+sentence_transformers = pytest.importorskip("sentence_transformers")
+
+from scripts.check_embedding_parity import CONTEXTS, PRODUCT  # noqa: E402
+from services.embedding_model import EMBED_MODEL_NAME, ONNX_MODEL_DIR, OnnxEmbedder  # noqa: E402
+
+if not (ONNX_MODEL_DIR / "model.onnx").exists():
+    pytest.skip(f"No ONNX export in {ONNX_MODEL_DIR}", allow_module_level=True)
+
+TEXTS = [PRODUCT] + list(CONTEXTS.values())
+
+
+def _top(scores: np.ndarray, k: int = 5) -> list[str]:
+    subs = list(CONTEXTS)
+    return [subs[i] for i in np.argsort(-scores)[:k]]
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    torch_model = sentence_transformers.SentenceTransformer(EMBED_MODEL_NAME)
+    torch_vecs = torch_model.encode(TEXTS, normalize_embeddings=True, convert_to_numpy=True)
+    onnx_vecs = OnnxEmbedder(ONNX_MODEL_DIR).encode(TEXTS, normalize_embeddings=True)
+    return torch_vecs, onnx_vecs
+
+
+def test_onnx_vectors_match_torch(vectors):
+    torch_vecs, onnx_vecs = vectors
+
+    cosines = np.sum(torch_vecs * onnx_vecs, axis=1)
+
+    assert onnx_vecs.shape == torch_vecs.shape
+    assert cosines.min() >= 0.99
+
+
+def test_onnx_keeps_the_semantic_ranking(vectors):
+    torch_vecs, onnx_vecs = vectors
+
+    torch_scores = torch_vecs[1:] @ torch_vecs[0]
+    onnx_scores = onnx_vecs[1:] @ onnx_vecs[0]
+
+    assert np.abs(onnx_scores - torch_scores).max() <= 0.02
+    assert _top(onnx_scores) == _top(torch_scores)
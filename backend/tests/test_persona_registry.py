@@ -0,0 +1,41 @@
+import json
+import random
+from pathlib import Path
+
+from services.persona_registry import PersonaRegistry
+
+PERSONAS = json.loads((Path(__file__).parent.parent / "personas.json").read_text())["personas"]
+
+
+def test_single_segment_subreddit_gets_distinct_personas():
+    random.seed(0)
+    raw = [dict(p) for p in PERSONAS]
+    raw[0]["segments"] = ["fitness"]
+    registry = PersonaRegistry(raw)
+
+    picks = registry.sample(15, segment="fitness")
+
+    assert len(picks) == 15
+    assert len({p.id for p in picks}) >= 5
+
+
+def test_interests_are_not_segments():
+    registry = PersonaRegistry(PERSONAS)
+    random.seed(1)
+
+    picks = registry.sample(12, segment="r/gaming")
+
+    assert len({p.id for p in picks}) >= 5
+
+
+def test_segment_members_are_favoured():
+    raw = [dict(p) for p in PERSONAS]
+    for p in raw[:3]:
+        p["segments"] = ["r/running"]
+    registry = PersonaRegistry(raw)
+    members = {p["id"] for p in raw[:3]}
+    random.seed(2)
+
+    picks = registry.sample(3, segment="running")
+
+    assert all(p.id in members for p in picks)
@@ -3,7 +3,7 @@
 import { useState, useEffect } from "react";
 import { useRouter } from "next/navigation";
 import { AnalysisResult, ScrapedSubreddit, PostDraft } from "@/lib/types";
-import { generatePosts } from "@/lib/api";
+import { generatePostsStream } from "@/lib/api";
 import {
   Download, ExternalLink, ChevronDown, ChevronUp,
   Shield, Activity, Brain, Sparkles, Loader2,
@@ -465,21 +465,32 @@ export default function ResultsPage() {
 
     try {
       const apiKey = localStorage.getItem("anthropic_api_key") || "";
-      const result = await generatePosts({
+      setSelectedDrafts(new Set());
+      // Drafts land per subreddit as they stream in; a subreddit's previous
+      // drafts stay on screen until its first new one arrives
+      const fresh = new Set<string>();
+      await generatePostsStream({
         product_name: data.product_name,
         product_description: data.product_description,
         niche_category: data.niche_category,
         target_audience: data.target_audience,
         keywords: data.keywords,
         subreddits: subs,
+        regenerate: hasGenerated,
+      }, (event) => {
+        const sub = event.subreddit;
+        if (!sub) return;
+        if (event.phase === "draft" && event.draft) {
+          const draft = event.draft;
+          const first = !fresh.has(sub);
+          fresh.add(sub);
+          setDraftsMap((prev) => ({ ...prev, [sub]: [...(first ? [] : prev[sub] || []), draft] }));
+        } else if (event.phase === "subreddit_done" && event.drafts) {
+          const drafts = event.drafts;
+          fresh.add(sub);
+          setDraftsMap((prev) => ({ ...prev, [sub]: drafts }));
+        }
       }, apiKey);
-
-      const map: Record<string, PostDraft[]> = {};
-      for (const sd of result.subreddit_drafts) {
-        map[sd.subreddit] = sd.drafts;
-      }
-      setDraftsMap(map);
-      setSelectedDrafts(new Set());
     } catch {
       setGenError("Failed to generate posts. Please try again.");
     } finally {
@@ -1,4 +1,4 @@
-import { DiscoverRequest, DiscoverResponse, GenerateRequest, GenerateResponse, PublishRequest, PublishResponse, ScrapeProgressEvent, ScrapeResponse } from "./types";
+import { DiscoverRequest, DiscoverResponse, GenerateRequest, GenerateResponse, GenerateStreamEvent, PublishRequest, PublishResponse, ScrapeProgressEvent, ScrapeResponse } from "./types";
 import { mockDiscoverResponse } from "./mock-data";
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || "";
@@ -194,6 +194,59 @@ export async function generatePosts(request: GenerateRequest, apiKey?: string):
   return res.json();
 }
 
+export async function generatePostsStream(
+  request: GenerateRequest,
+  onEvent: (event: GenerateStreamEvent) => void,
+  apiKey?: string
+): Promise<GenerateResponse> {
+  if (!API_URL) {
+    const result = await generatePosts(request, apiKey);
+    for (const sd of result.subreddit_drafts) {
+      onEvent({ phase: "subreddit_done", subreddit: sd.subreddit, drafts: sd.drafts });
+    }
+    onEvent({ phase: "done", progress: 100, result });
+    return result;
+  }
+
+  const res = await fetch(`${API_URL}/api/generate-stream`, {
+    method: "POST",
+    headers: buildHeaders(apiKey),
+    body: JSON.stringify(request),
+  });
+
+  if (!res.ok) throw new Error(`Generation failed: ${res.statusText}`);
+
+  const reader = res.body!.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let finalResult: GenerateResponse | null = null;
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split("\n");
+    buffer = lines.pop() || "";
+
+    for (const line of lines) {
+      if (line.startsWith("data: ")) {
+        const event: GenerateStreamEvent = JSON.parse(line.slice(6));
+        onEvent(event);
+        if (event.phase === "done" && event.result) {
+          finalResult = event.result;
+        }
+        if (event.phase === "error") {
+          throw new Error(event.message);
+        }
+      }
+    }
+  }
+
+  if (!finalResult) throw new Error("Stream ended without results");
+  return finalResult;
+}
+
 export async function publishPosts(request: PublishRequest, apiKey?: string): Promise<PublishResponse> {
   if (!API_URL) {
     await new Promise((r) => setTimeout(r, 1500));
@@ -4,6 +4,8 @@ export interface DiscoverRequest {
   niche_category: string;
   target_audience: string;
   keywords: string[];
+  // "fast" skips extended thinking (quicker, slightly less considered picks)
+  mode?: "thorough" | "fast";
 }
 
 export interface PostDraft {
@@ -34,6 +36,7 @@ export interface DiscoverResponse {
   product_name: string;
   enhanced_queries: string[];
   subreddits: SubredditResult[];
+  cached?: boolean;
 }
 
 export interface PublishPost {
@@ -95,6 +98,8 @@ export interface ScrapeProgressEvent {
   subreddit?: string;
   progress: number;
   message: string;
+  /** Provisional ranking of the subreddits scored so far (scoring events only). */
+  partial?: ScrapeResponse;
   result?: ScrapeResponse;
 }
 
@@ -119,6 +124,8 @@ export interface GenerateRequest {
   target_audience: string;
   keywords: string[];
   subreddits: ScrapedSubreddit[];
+  // Bypass the server-side draft cache (the Regenerate button)
+  regenerate?: boolean;
 }
 
 export interface SubredditDrafts {
@@ -131,6 +138,19 @@ export interface GenerateResponse {
   subreddit_drafts: SubredditDrafts[];
 }
 
+export interface GenerateStreamEvent {
+  phase: "generating" | "draft_delta" | "draft" | "subreddit_done" | "done" | "error";
+  subreddit?: string;
+  progress?: number;
+  message?: string;
+  draft_index?: number;
+  /** Fields of the draft still being written (draft_delta events only). */
+  partial?: Partial<Pick<PostDraft, "type" | "title" | "body">>;
+  draft?: PostDraft;
+  drafts?: PostDraft[];
+  result?: GenerateResponse;
+}
+
 // --- Dashboard / monitoring types ---
 
 export interface CommentData {